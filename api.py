@@ -0,0 +1,460 @@
+import json
+from datetime import date, datetime
+from urllib.parse import urlencode
+
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+)
+
+from app import db
+from database import read_only
+from models import Artist, Genre, Venue, genre_artist_table, genre_venue_table
+import facets
+import queries
+import show_calendar
+
+# Versioned JSON read API. List endpoints run on a server-side cursor and
+# stream rows as they are fetched, either as one JSON array or as NDJSON
+# (?format=ndjson or Accept: application/x-ndjson), so a full export runs in
+# constant memory. Passing ?limit= returns a single page instead, with the
+# next page's URL in the Link header. The /facets endpoints filter venues
+# and artists by genre, state, city and seeking flag from facets.py's
+# in-memory bitmaps and return the matching ids with per-facet counts.
+# The /calendar and /heatmap endpoints return one month or week of a venue's
+# or artist's shows and per-day or per-week show counts.
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+VENUE_COLUMNS = (
+    Venue.id,
+    Venue.name,
+    Venue.city,
+    Venue.state,
+    Venue.address,
+    Venue.phone,
+    Venue.image_link,
+    Venue.facebook_link,
+    Venue.website_link,
+    Venue.looking_for_talent.label("seeking_talent"),
+    Venue.seeking_description,
+    Venue.upcoming_shows_count,
+    Venue.past_shows_count,
+)
+
+ARTIST_COLUMNS = (
+    Artist.id,
+    Artist.name,
+    Artist.city,
+    Artist.state,
+    Artist.phone,
+    Artist.image_link,
+    Artist.facebook_link,
+    Artist.website_link,
+    Artist.looking_for_venue.label("seeking_venue"),
+    Artist.seeking_description,
+    Artist.upcoming_shows_count,
+    Artist.past_shows_count,
+)
+
+
+@api.route("/venues")
+@read_only
+def venues():
+    statement = db.select(*VENUE_COLUMNS)
+    statement = _filter_entities(statement, Venue, Venue.looking_for_talent)
+    return _listing(statement, Venue.id, genres=(genre_venue_table, "venue"))
+
+
+@api.route("/venues/<int:venue_id>")
+@read_only
+def venue(venue_id):
+    statement = db.select(*VENUE_COLUMNS).where(Venue.id == venue_id)
+    return _detail(statement, genres=(genre_venue_table, "venue"))
+
+
+@api.route("/artists")
+@read_only
+def artists():
+    statement = db.select(*ARTIST_COLUMNS)
+    statement = _filter_entities(statement, Artist, Artist.looking_for_venue)
+    return _listing(statement, Artist.id, genres=(genre_artist_table, "artist"))
+
+
+@api.route("/artists/<int:artist_id>")
+@read_only
+def artist(artist_id):
+    statement = db.select(*ARTIST_COLUMNS).where(Artist.id == artist_id)
+    return _detail(statement, genres=(genre_artist_table, "artist"))
+
+
+@api.route("/venues/facets")
+@read_only
+def venue_facets():
+    return _facet_listing(Venue)
+
+
+@api.route("/artists/facets")
+@read_only
+def artist_facets():
+    return _facet_listing(Artist)
+
+
+@api.route("/venues/<int:venue_id>/calendar")
+@read_only
+def venue_calendar(venue_id):
+    return _calendar(Venue, venue_id)
+
+
+@api.route("/artists/<int:artist_id>/calendar")
+@read_only
+def artist_calendar(artist_id):
+    return _calendar(Artist, artist_id)
+
+
+@api.route("/venues/<int:venue_id>/heatmap")
+@read_only
+def venue_heatmap(venue_id):
+    return _heatmap(Venue, venue_id)
+
+
+@api.route("/artists/<int:artist_id>/heatmap")
+@read_only
+def artist_heatmap(artist_id):
+    return _heatmap(Artist, artist_id)
+
+
+@api.route("/shows")
+@read_only
+def shows():
+    # Archived shows are part of the export unless only upcoming ones are
+    # asked for.
+    when = request.args.get("when")
+    source = queries.show_source(when)
+    statement = _show_statement(source)
+
+    if when == "upcoming":
+        statement = statement.where(source.c.start_time > datetime.now())
+    elif when == "past":
+        statement = statement.where(source.c.start_time <= datetime.now())
+
+    try:
+        start = _argument("from", date.fromisoformat)
+        end = _argument("to", date.fromisoformat)
+        ids = {key: _argument(key, int) for key in ("venue_id", "artist_id")}
+        after = _argument("after", queries.parse_cursor)
+    except ValueError as invalid:
+        return _bad_request(str(invalid))
+
+    if start:
+        statement = statement.where(source.c.start_time >= start)
+    if end:
+        statement = statement.where(source.c.start_time < end)
+
+    for column in (source.c.venue_id, source.c.artist_id):
+        if ids[column.key] is not None:
+            statement = statement.where(column == ids[column.key])
+
+    if after:
+        statement = statement.where(db.tuple_(source.c.start_time, source.c.id) > after)
+
+    return _listing(
+        statement.order_by(source.c.start_time, source.c.id),
+        None,
+        cursor=lambda row: queries.format_cursor(
+            datetime.fromisoformat(row["start_time"]), row["id"]
+        ),
+    )
+
+
+@api.route("/shows/<int:show_id>")
+@read_only
+def show(show_id):
+    source = queries.all_shows()
+    row = db.session.execute(
+        _show_statement(source).where(source.c.id == show_id)
+    ).first()
+    if row is None:
+        return _not_found()
+    return jsonify(_serialize(row._mapping))
+
+
+def _show_statement(source):
+    return (
+        db.select(
+            source.c.id,
+            source.c.start_time,
+            source.c.venue_id,
+            Venue.name.label("venue_name"),
+            source.c.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .select_from(source)
+        .join(Venue, Venue.id == source.c.venue_id)
+        .join(Artist, Artist.id == source.c.artist_id)
+    )
+
+
+def _filter_entities(statement, model, seeking_column):
+    for column in (model.state, model.city):
+        value = request.args.get(column.key)
+        if value:
+            statement = statement.where(column == value)
+
+    seeking = request.args.get("seeking")
+    if seeking is not None:
+        statement = statement.where(
+            seeking_column.is_(seeking.lower() in ("1", "true"))
+        )
+
+    return statement
+
+
+def _facet_listing(model):
+    """Return one page of ids matching every ``genre`` and any ``state`` and
+    ``city`` given, with the counts of each facet value within that match.
+    """
+    seeking = request.args.get("seeking")
+    if seeking is not None:
+        seeking = seeking.lower() in ("1", "true")
+    selection, counts = facets.index.query(
+        model,
+        genres=request.args.getlist("genre"),
+        states=request.args.getlist("state"),
+        cities=request.args.getlist("city"),
+        seeking=seeking,
+    )
+
+    max_limit = current_app.config["API_MAX_PAGE_SIZE"]
+    try:
+        limit = min(_limit() or max_limit, max_limit)
+        after = max(0, _argument("after", int) or 0)
+    except ValueError as invalid:
+        return _bad_request(str(invalid))
+    ids = facets.ids(selection, after, limit + 1)
+
+    headers = {}
+    if len(ids) > limit:
+        ids = ids[:limit]
+        args = {**request.args.to_dict(flat=False), "after": ids[-1]}
+        next_url = f"{request.base_url}?{urlencode(args, doseq=True)}"
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    data = {"count": selection.bit_count(), "ids": ids, "facets": counts}
+    return jsonify(data), headers
+
+
+def _calendar(model, id):
+    try:
+        start, end, unit = show_calendar.parse_window(
+            request.args.get("month"), request.args.get("week")
+        )
+    except ValueError:
+        return _bad_request("month must be YYYY-MM and week YYYY-MM-DD")
+    if not show_calendar.exists(model, id):
+        return _not_found()
+
+    shows = show_calendar.shows(model, id, start, end)
+    counts = show_calendar.day_counts(model, id, start, end)
+    return jsonify(
+        {
+            "unit": unit,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days": {day.isoformat(): counts[day] for day in sorted(counts)},
+            "shows": [_serialize(show) for show in shows],
+        }
+    )
+
+
+def _heatmap(model, id):
+    """Return dense per-day or per-week show counts over ``[from, to)``.
+
+    Defaults to day buckets over the current calendar year.
+    """
+    by = request.args.get("by", "day")
+    if by not in ("day", "week"):
+        return _bad_request("by must be 'day' or 'week'")
+    year = date.today().year
+    try:
+        start = _argument("from", date.fromisoformat) or date(year, 1, 1)
+        end = _argument("to", date.fromisoformat) or date(year + 1, 1, 1)
+    except ValueError as invalid:
+        return _bad_request(str(invalid))
+    if end <= start:
+        return _bad_request("to must be after from")
+    try:
+        show_calendar.check_year(start)
+        show_calendar.check_year(end)
+    except ValueError as invalid:
+        return _bad_request(str(invalid))
+    limit = current_app.config["CALENDAR_MAX_BUCKETS"]
+    if show_calendar.bucket_count(start, end, by) > limit:
+        return _bad_request(f"at most {limit} buckets per request")
+    if not show_calendar.exists(model, id):
+        return _not_found()
+
+    counts = show_calendar.day_counts(model, id, start, end)
+    buckets = show_calendar.buckets(counts, start, end, by)
+    return jsonify(
+        {
+            "by": by,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "total": sum(counts.values()),
+            "buckets": [
+                {"start": bucket.isoformat(), "shows": count}
+                for bucket, count in buckets
+            ],
+        }
+    )
+
+
+def _listing(statement, id_column, genres=None, cursor=None):
+    """Return a paged or streamed response for ``statement``.
+
+    Entity listings page by ``id_column`` (``?after=<id>``); the shows
+    listing is already ordered and filtered and passes ``cursor`` to build
+    the next ``after`` value from the last row.
+    """
+    try:
+        limit = _limit()
+        after = _argument("after", int) if id_column is not None else None
+    except ValueError as invalid:
+        return _bad_request(str(invalid))
+
+    if id_column is not None:
+        if after is not None:
+            statement = statement.where(id_column > after)
+        statement = statement.order_by(id_column)
+        cursor = lambda row: row["id"]
+
+    headers = {}
+
+    if limit is not None:
+        limit = min(limit, current_app.config["API_MAX_PAGE_SIZE"])
+        rows = [
+            _serialize(row._mapping)
+            for row in db.session.execute(statement.limit(limit + 1))
+        ]
+        if genres:
+            _attach_genres(rows, *genres)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            args = {**request.args.to_dict(), "after": cursor(rows[-1])}
+            next_url = f"{request.base_url}?{urlencode(args)}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        batches = iter([rows])
+    else:
+        batches = _stream(statement, genres)
+
+    ndjson = request.args.get("format") == "ndjson" or (
+        request.accept_mimetypes.best == "application/x-ndjson"
+    )
+    if ndjson:
+        body = _ndjson(batches)
+        mimetype = "application/x-ndjson"
+    else:
+        body = _json_array(batches)
+        mimetype = "application/json"
+
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
+def _stream(statement, genres):
+    batch_size = current_app.config["API_BATCH_SIZE"]
+    result = db.session.execute(statement.execution_options(stream_results=True))
+    try:
+        for partition in result.partitions(batch_size):
+            rows = [_serialize(row._mapping) for row in partition]
+            if genres:
+                _attach_genres(rows, *genres)
+            yield rows
+    finally:
+        result.close()
+
+
+def _attach_genres(rows, table, column):
+    """Add a ``genres`` list to each entity row with one query per batch."""
+    by_id = {row["id"]: row for row in rows}
+    for row in rows:
+        row["genres"] = []
+
+    if not by_id:
+        return
+
+    entity_column = table.c[column]
+    genre_rows = db.session.execute(
+        db.select(entity_column, Genre.name)
+        .join(Genre, Genre.id == table.c.genre)
+        .where(entity_column.in_(list(by_id)))
+        .order_by(entity_column, Genre.name)
+    )
+    for entity_id, name in genre_rows:
+        by_id[entity_id]["genres"].append(name)
+
+
+def _detail(statement, genres):
+    row = db.session.execute(statement).first()
+    if row is None:
+        return _not_found()
+
+    data = _serialize(row._mapping)
+    _attach_genres([data], *genres)
+    return jsonify(data)
+
+
+def _json_array(batches):
+    yield "["
+    first = True
+    for rows in batches:
+        for row in rows:
+            yield ("" if first else ",") + json.dumps(row, separators=(",", ":"))
+            first = False
+    yield "]"
+
+
+def _ndjson(batches):
+    for rows in batches:
+        yield "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+
+
+def _serialize(mapping):
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in mapping.items()
+    }
+
+
+def _not_found():
+    return jsonify({"error": "not found"}), 404
+
+
+def _argument(name, type):
+    """Return query argument ``name`` converted by ``type``, or ``None``.
+
+    Raises ``ValueError`` naming the argument when it cannot be converted.
+    """
+    value = request.args.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return type(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid {name} {value!r}")
+
+
+def _limit():
+    limit = _argument("limit", int)
+    if limit is not None and limit < 1:
+        raise ValueError(f"invalid limit {limit}: must be at least 1")
+    return limit
+
+
+def _bad_request(message):
+    return jsonify({"error": message}), 400
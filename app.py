@@ -4,8 +4,6 @@
 
 import sys
 import json
-import dateutil.parser
-import babel
 from flask import (
     Flask,
     render_template,
@@ -18,13 +16,18 @@ from flask import (
     jsonify,
 )
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-from datetime import datetime
+from formatting import DateTimeFormatter
+from cache import ResponseCache
+from database import RoutingSQLAlchemy, read_only
+import instrumentation
+import metrics
+import profiler
+from datetime import date, datetime
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -33,7 +36,11 @@ from datetime import datetime
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object("config")
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
+cache = ResponseCache(app)
+instrumentation.init_app(app)
+metrics.init_app(app, db, cache)
+profiler.init_app(app)
 
 migrate = Migrate(app, db)
 
@@ -42,26 +49,36 @@ migrate = Migrate(app, db)
 # ----------------------------------------------------------------------------#
 
 from models import *
+import genre_registry
+import queries
+import search
+import suggest
+import matching
+import scheduling
+import show_calendar
+import show_counters
+from conditional import conditional
+import changes
+import commands
+from api import api
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format="medium"):
-    if isinstance(value, str):
-        date = dateutil.parser.parse(value)
-    else:
-        date = value
-    if format == "full":
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == "medium":
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale="en")
-
+format_datetime = DateTimeFormatter(
+    locale="en", cache_size=app.config["DATETIME_CACHE_SIZE"]
+)
 
 app.jinja_env.filters["datetime"] = format_datetime
 
+# ----------------------------------------------------------------------------#
+# Blueprints.
+# ----------------------------------------------------------------------------#
+
+app.register_blueprint(api)
+
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
@@ -77,140 +94,54 @@ def index():
 
 
 @app.route("/venues")
+@read_only
+@conditional()
+@cache.cached
 def venues():
-    error = False
-    data = []
-
-    venues = Venue.query.all()
-
-    locations = set()
-    for venue in venues:
-        locations.add((venue.state, venue.city))
-
-    unique_locations = list(locations)
-
-    current_date = datetime.now()
-
-    for location in locations:
-        venue_list = []
-
-        for venue in venues:
-            if (venue.state == location[0]) and (venue.city == location[1]):
-                shows = Show.query.filter(
-                    Show.venue_id == venue.id, Show.start_time > current_date
-                ).all()
-
-                venue_list.append(
-                    {
-                        "id": venue.id,
-                        "name": venue.name,
-                        "num_upcoming_shows": len(shows),
-                    }
-                )
-
-        data.append({"city": location[1], "state": location[0], "venues": venue_list})
+    data = queries.venue_areas()
 
     return render_template("pages/venues.html", areas=data)
 
 
 @app.route("/venues/search", methods=["POST"])
+@read_only
 def search_venues():
-    data = []
     search_term = request.form.get("search_term", "")
-    venues = Venue.query.filter(Venue.name.ilike(f"%{search_term.lower()}%")).all()
-    current_date = datetime.now()
-
-    for venue in venues:
-        shows = Show.query.filter(
-            Show.venue_id == venue.id, Show.start_time > current_date
-        ).all()
-
-        data.append(
-            {
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": len(shows),
-            }
-        )
-
-    response = {
-        "count": len(data),
-        "data": data,
-    }
+    offset = max(0, request.form.get("offset", 0, type=int))
+    limit = app.config["SEARCH_PAGE_SIZE"]
+    response = search.search(Venue, search_term, limit, offset)
 
     return render_template(
         "pages/search_venues.html",
         results=response,
         search_term=search_term,
+        offset=offset,
+        limit=limit,
     )
 
 
 @app.route("/venues/<int:venue_id>")
+@read_only
+@conditional(lambda venue_id: (Show.venue_id == venue_id,))
+@cache.cached
 def show_venue(venue_id):
-    venue = Venue.query.get(venue_id)
-
-    if venue:
-        now = datetime.now()
-        genres = []
-        past_shows = []
-        upcoming_shows = []
-
-        for genre in venue.genres:
-            genres.append(genre.name)
-
-        upcoming_shows_list = Show.query.filter(
-            Show.venue_id == venue_id, Show.start_time > now
-        ).all()
-        past_shows_list = Show.query.filter(
-            Show.venue_id == venue_id, Show.start_time < now
-        ).all()
-
-        for show in upcoming_shows_list:
-            upcoming_shows.append(
-                {
-                    "artist_id": show.artist.id,
-                    "artist_name": show.artist.name,
-                    "artist_image_link": show.artist.image_link,
-                    "start_time": format_datetime(
-                        show.start_time,
-                    ),
-                }
-            )
-
-        for show in past_shows_list:
-            past_shows.append(
-                {
-                    "artist_id": show.artist.id,
-                    "artist_name": show.artist.name,
-                    "artist_image_link": show.artist.image_link,
-                    "start_time": format_datetime(show.start_time),
-                }
-            )
-
-        data = {
-            "id": venue.id,
-            "name": venue.name,
-            "genres": genres,
-            "address": venue.address,
-            "city": venue.city,
-            "state": venue.state,
-            "phone": venue.phone,
-            "website": venue.website_link,
-            "facebook_link": venue.facebook_link,
-            "seeking_talent": venue.looking_for_talent,
-            "seeking_description": venue.seeking_description,
-            "image_link": venue.image_link,
-            "past_shows": past_shows,
-            "past_shows_count": len(past_shows),
-            "upcoming_shows": upcoming_shows,
-            "upcoming_shows_count": len(upcoming_shows),
-        }
+    data = queries.venue_detail(venue_id, datetime.now(), **detail_show_args())
 
+    if data:
         return render_template("pages/show_venue.html", venue=data)
     else:
         return redirect(url_for("index"))
 
 
+def detail_show_args():
+    return {
+        "past_before": request.args.get("past_before", type=queries.parse_cursor),
+        "archive": request.args.get("archive") == "1",
+        "per_page": app.config["PAST_SHOWS_PER_PAGE"],
+        "upcoming_limit": app.config["UPCOMING_SHOWS_SHOWN"],
+    }
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -229,16 +160,7 @@ def create_venue_submission():
         error = False
 
         try:
-            venue_genres = []
-
-            for genre in form.genres.data:
-                existing_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if not existing_genre:
-                    new_genre = Genre(name=genre)
-                    venue_genres.append(new_genre)
-                    db.session.add(new_genre)
-                else:
-                    venue_genres.append(existing_genre)
+            venue_genres = genre_registry.resolve(form.genres.data)
 
             venue = Venue(
                 name=form.name.data,
@@ -256,6 +178,7 @@ def create_venue_submission():
 
             db.session.add(venue)
             db.session.commit()
+            venue_id = venue.id
         except:
             error = True
             db.session.rollback()
@@ -267,6 +190,7 @@ def create_venue_submission():
             flash(f"An error occurred. Venue {form.name.data} could not be listed.")
             abort(500)
         else:
+            changes.venue_saved(venue_id, created=True)
             flash(f"Venue {form.name.data} was successfully listed!")
             return redirect(url_for("venues"))
     else:
@@ -283,6 +207,21 @@ def delete_venue(venue_id):
         name = venue.name
 
         try:
+            artist_ids = set()
+            for model in (Show, ShowArchive):
+                artist_ids.update(
+                    artist_id
+                    for (artist_id,) in db.session.query(model.artist_id)
+                    .filter(model.venue_id == venue.id)
+                    .distinct()
+                )
+                model.query.filter(model.venue_id == venue.id).delete(
+                    synchronize_session=False
+                )
+            show_counters.recount(Artist, datetime.now(), artist_ids)
+            show_counters.recount_days(Artist, artist_ids)
+            show_counters.recount_days(Venue, [venue.id])
+
             db.session.delete(venue)
             db.session.commit()
         except:
@@ -296,6 +235,7 @@ def delete_venue(venue_id):
             flash(f"An error occurred deleting venue {name}.")
             abort(500)
         else:
+            changes.venue_deleted(int(venue_id), artist_ids)
             flash(f"Venue {name} was successfully deleted!")
             return jsonify({"deleted": True})
 
@@ -306,102 +246,40 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route("/artists")
+@read_only
+@conditional()
+@cache.cached
 def artists():
-    artists = Artist.query.all()
-    data = [{"id": artist.id, "name": artist.name} for artist in artists]
+    data = queries.summaries(Artist)
 
     return render_template("pages/artists.html", artists=data)
 
 
 @app.route("/artists/search", methods=["POST"])
+@read_only
 def search_artists():
-    data = []
     search_term = request.form.get("search_term", "")
-    artists = Artist.query.filter(Artist.name.ilike(f"%{search_term.lower()}%")).all()
-    current_date = datetime.now()
-
-    for artist in artists:
-        shows = Show.query.filter(
-            Show.artist_id == artist.id, Show.start_time > current_date
-        ).all()
-
-        data.append(
-            {
-                "id": artist.id,
-                "name": artist.name,
-                "num_upcoming_shows": len(shows),
-            }
-        )
-
-    response = {
-        "count": len(data),
-        "data": data,
-    }
+    offset = max(0, request.form.get("offset", 0, type=int))
+    limit = app.config["SEARCH_PAGE_SIZE"]
+    response = search.search(Artist, search_term, limit, offset)
 
     return render_template(
         "pages/search_artists.html",
         results=response,
         search_term=search_term,
+        offset=offset,
+        limit=limit,
     )
 
 
 @app.route("/artists/<int:artist_id>")
+@read_only
+@conditional(lambda artist_id: (Show.artist_id == artist_id,))
+@cache.cached
 def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
+    data = queries.artist_detail(artist_id, datetime.now(), **detail_show_args())
 
-    if artist:
-        now = datetime.now()
-        genres = []
-        past_shows = []
-        upcoming_shows = []
-
-        for genre in artist.genres:
-            genres.append(genre.name)
-
-        upcoming_shows_list = Show.query.filter(
-            Show.artist_id == artist.id, Show.start_time > now
-        ).all()
-        past_shows_list = Show.query.filter(
-            Show.artist_id == artist.id, Show.start_time < now
-        ).all()
-
-        for show in upcoming_shows_list:
-            upcoming_shows.append(
-                {
-                    "venue_id": show.venue.id,
-                    "venue_name": show.venue.name,
-                    "venue_image_link": show.venue.image_link,
-                    "start_time": format_datetime(show.start_time),
-                }
-            )
-
-        for show in past_shows_list:
-            past_shows.append(
-                {
-                    "venue_id": show.venue.id,
-                    "venue_name": show.venue.name,
-                    "venue_image_link": show.venue.image_link,
-                    "start_time": format_datetime(show.start_time),
-                }
-            )
-
-        data = {
-            "id": artist.id,
-            "name": artist.name,
-            "genres": genres,
-            "city": artist.city,
-            "state": artist.state,
-            "phone": artist.phone,
-            "website": artist.website_link,
-            "facebook_link": artist.facebook_link,
-            "seeking_venue": artist.looking_for_venue,
-            "seeking_description": artist.seeking_description,
-            "image_link": artist.image_link,
-            "past_shows": past_shows,
-            "past_shows_count": len(past_shows),
-            "upcoming_shows": upcoming_shows,
-            "upcoming_shows_count": len(upcoming_shows),
-        }
+    if data:
         return render_template("pages/show_artist.html", artist=data)
     else:
         return redirect(url_for("index"))
@@ -438,16 +316,7 @@ def edit_artist_submission(artist_id):
         error = False
 
         try:
-            artist_genres = []
-
-            for genre in form.genres.data:
-                existing_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if not existing_genre:
-                    new_genre = Genre(name=genre)
-                    artist_genres.append(new_genre)
-                    db.session.add(new_genre)
-                else:
-                    artist_genres.append(existing_genre)
+            artist_genres = genre_registry.resolve(form.genres.data)
 
             artist.name = form.name.data
             artist.city = form.city.data
@@ -472,6 +341,7 @@ def edit_artist_submission(artist_id):
             flash(f"An error occurred. Artist {form.name.data} could not be edited.")
             abort(500)
         else:
+            changes.artist_saved(artist_id)
             flash(f"Artist {form.name.data} was successfully edited!")
             return redirect(url_for("show_artist", artist_id=artist_id))
     else:
@@ -508,16 +378,7 @@ def edit_venue_submission(venue_id):
         error = False
 
         try:
-            venue_genres = []
-
-            for genre in form.genres.data:
-                existing_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if not existing_genre:
-                    new_genre = Genre(name=genre)
-                    venue_genres.append(new_genre)
-                    db.session.add(new_genre)
-                else:
-                    venue_genres.append(existing_genre)
+            venue_genres = genre_registry.resolve(form.genres.data)
 
             venue.name = form.name.data
             venue.city = form.city.data
@@ -543,6 +404,7 @@ def edit_venue_submission(venue_id):
             flash(f"An error occurred. Venue {form.name.data} could not be edited.")
             abort(500)
         else:
+            changes.venue_saved(venue_id)
             flash(f"Venue {form.name.data} was successfully edited!")
             return redirect(url_for("show_venue", venue_id=venue_id))
     else:
@@ -568,23 +430,14 @@ def create_artist_submission():
         error = False
 
         try:
-            artis_genres = []
-
-            for genre in form.genres.data:
-                existing_genre = Genre.query.filter_by(name=genre).one_or_none()
-                if not existing_genre:
-                    new_genre = Genre(name=genre)
-                    artis_genres.append(new_genre)
-                    db.session.add(new_genre)
-                else:
-                    artis_genres.append(existing_genre)
+            artist_genres = genre_registry.resolve(form.genres.data)
 
             artist = Artist(
                 name=form.name.data,
                 city=form.city.data,
                 state=form.state.data,
                 phone=form.phone.data,
-                genres=artis_genres,
+                genres=artist_genres,
                 looking_for_venue=form.seeking_venue.data,
                 seeking_description=form.seeking_description.data,
                 image_link=form.image_link.data,
@@ -594,6 +447,7 @@ def create_artist_submission():
 
             db.session.add(artist)
             db.session.commit()
+            artist_id = artist.id
         except:
             error = True
             db.session.rollback()
@@ -605,6 +459,7 @@ def create_artist_submission():
             flash(f"An error occurred. Artist {form.name.data} could not be listed.")
             abort(500)
         else:
+            changes.artist_saved(artist_id, created=True)
             flash(f"Artist {form.name.data} was successfully listed!")
             return redirect(url_for("artists"))
     else:
@@ -617,21 +472,32 @@ def create_artist_submission():
 
 
 @app.route("/shows")
+@read_only
+@conditional(lambda: ())
+@cache.cached
 def shows():
-    shows = Show.query.all()
-    data = [
-        {
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": format_datetime(str(show.start_time)),
-        }
-        for show in shows
-    ]
+    when = request.args.get("when")
+    start = request.args.get("from", type=date.fromisoformat)
+    end = request.args.get("to", type=date.fromisoformat)
+    per_page = min(
+        request.args.get("per_page", app.config["SHOWS_PER_PAGE"], type=int),
+        app.config["SHOWS_MAX_PER_PAGE"],
+    )
 
-    return render_template("pages/shows.html", shows=data)
+    data, next_cursor = queries.show_page(
+        datetime.now(),
+        after=request.args.get("after", type=queries.parse_cursor),
+        when=when if when in ("upcoming", "past") else None,
+        start=start,
+        end=end,
+        per_page=max(per_page, 1),
+    )
+
+    next_url = None
+    if next_cursor:
+        next_url = url_for("shows", **{**request.args.to_dict(), "after": next_cursor})
+
+    return render_template("pages/shows.html", shows=data, next_url=next_url)
 
 
 @app.route("/shows/create")
@@ -646,27 +512,24 @@ def create_show_submission():
     form = ShowForm(request.form)
 
     if form.validate():
-        error = False
-
         try:
-            venue = Venue.query.get(form.venue_id.data or 0)
-            if not venue:
-                flash(f"No venue with that ID exists!")
-                return redirect(url_for("create_show_submission"))
-
-            artist = Artist.query.get(form.artist_id.data or 0)
-            if not artist:
-                flash(f"No artist with that ID exists!")
-                return redirect(url_for("create_show_submission"))
-
-            show = Show(
-                venue=venue,
-                artist=artist,
-                start_time=form.start_time.data,
+            show = scheduling.parse(
+                {
+                    "venue_id": form.venue_id.data,
+                    "artist_id": form.artist_id.data,
+                    "start_time": form.start_time.data,
+                }
             )
+        except ValueError as invalid:
+            flash(f"Show could not be listed: {invalid}.")
+            return redirect(url_for("create_show_submission"))
 
-            db.session.add(show)
-            db.session.commit()
+        error = False
+
+        try:
+            (result,) = scheduling.schedule([show], datetime.now())
+            if result.scheduled:
+                db.session.commit()
         except:
             error = True
             db.session.rollback()
@@ -677,7 +540,11 @@ def create_show_submission():
         if error:
             flash(f"An error occurred. Show could not be listed.")
             abort(500)
+        elif not result.scheduled:
+            flash(f"Show could not be listed: {result.error}.")
+            return redirect(url_for("create_show_submission"))
         else:
+            changes.shows_added([show])
             flash(f"Show was successfully listed!")
             return redirect(url_for("shows"))
     else:
@@ -685,6 +552,159 @@ def create_show_submission():
         return redirect(url_for("create_show_submission"))
 
 
+@app.route("/shows/batch", methods=["POST"])
+def create_shows_batch():
+    rows = request.get_json(silent=True)
+    if isinstance(rows, dict):
+        rows = rows.get("shows")
+    if not isinstance(rows, list):
+        return jsonify({"error": "expected a JSON array of shows"}), 400
+    if len(rows) > app.config["SHOW_BATCH_MAX"]:
+        limit = app.config["SHOW_BATCH_MAX"]
+        return jsonify({"error": f"at most {limit} shows per batch"}), 413
+
+    try:
+        report, accepted = scheduling.schedule_rows(enumerate(rows), datetime.now())
+        db.session.commit()
+    except:
+        db.session.rollback()
+        print(sys.exc_info())
+        return jsonify({"error": "shows could not be scheduled"}), 500
+    finally:
+        db.session.close()
+
+    changes.shows_added(accepted)
+    return jsonify(
+        {
+            "scheduled": len(accepted),
+            "rejected": len(report) - len(accepted),
+            "results": report,
+        }
+    )
+
+
+#  Matches
+#  ----------------------------------------------------------------
+
+
+@app.route("/venues/<int:venue_id>/matches")
+@read_only
+def venue_matches(venue_id):
+    return render_matches(Venue, venue_id)
+
+
+@app.route("/artists/<int:artist_id>/matches")
+@read_only
+def artist_matches(artist_id):
+    return render_matches(Artist, artist_id)
+
+
+def render_matches(model, id):
+    subject = model.query.get(id)
+    if not subject:
+        return redirect(url_for("index"))
+
+    matches = matching.index.matches(model, id, app.config["MATCH_LIMIT"])
+    return render_template(
+        "pages/matches.html",
+        subject=subject,
+        subject_type="venue" if model is Venue else "artist",
+        matches=matches,
+    )
+
+
+#  Calendar
+#  ----------------------------------------------------------------
+
+
+@app.route("/venues/<int:venue_id>/calendar")
+@read_only
+def venue_calendar(venue_id):
+    return render_calendar(Venue, venue_id)
+
+
+@app.route("/artists/<int:artist_id>/calendar")
+@read_only
+def artist_calendar(artist_id):
+    return render_calendar(Artist, artist_id)
+
+
+def render_calendar(model, id):
+    subject = model.query.get(id)
+    if not subject:
+        return redirect(url_for("index"))
+
+    try:
+        start, end, unit = show_calendar.parse_window(
+            request.args.get("month"), request.args.get("week")
+        )
+    except ValueError:
+        flash("Pick a month as YYYY-MM or a week as YYYY-MM-DD.")
+        start, end, unit = show_calendar.parse_window()
+
+    counts = show_calendar.day_counts(model, id, start, end)
+    shows = show_calendar.shows(model, id, start, end)
+    subject_type = "venue" if model is Venue else "artist"
+    previous, following = show_calendar.neighbours(start, unit)
+    view_args = {f"{subject_type}_id": id}
+
+    return render_template(
+        "pages/calendar.html",
+        subject=subject,
+        subject_type=subject_type,
+        start=start,
+        unit=unit,
+        total=sum(counts.values()),
+        weeks=show_calendar.grid(start, end, counts, shows),
+        previous_url=url_for(request.endpoint, **view_args, **previous),
+        next_url=url_for(request.endpoint, **view_args, **following),
+    )
+
+
+#  Suggest
+#  ----------------------------------------------------------------
+
+
+@app.route("/api/suggest")
+def suggest_names():
+    model = suggest.MODELS.get(request.args.get("type"))
+    if model is None:
+        return jsonify({"error": "type must be 'venue' or 'artist'"}), 400
+
+    limit = request.args.get("limit", app.config["SUGGEST_LIMIT"], type=int)
+    limit = max(1, min(limit, app.config["SUGGEST_MAX_LIMIT"]))
+    endpoint = "show_venue" if model is Venue else "show_artist"
+    key = "venue_id" if model is Venue else "artist_id"
+    return jsonify(
+        [
+            {"id": id, "name": name, "url": url_for(endpoint, **{key: id})}
+            for id, name in suggest.index.lookup(
+                model, request.args.get("q", ""), limit
+            )
+        ]
+    )
+
+
+#  Cache
+#  ----------------------------------------------------------------
+
+
+@app.route("/cache/stats")
+@metrics.ops_only
+def cache_stats():
+    return jsonify(cache.stats())
+
+
+#  Database
+#  ----------------------------------------------------------------
+
+
+@app.route("/db/stats")
+@metrics.ops_only
+def db_stats():
+    return jsonify(db.pool_stats(app))
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template("errors/404.html"), 404
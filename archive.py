@@ -0,0 +1,161 @@
+import re
+from datetime import date
+
+from app import db
+from models import Show, ShowArchive
+
+# Hot/cold storage for shows. On Postgres, Show and ShowArchive are both
+# partitioned by month of start_time ("Show_p2024_01", ...), each with a
+# DEFAULT partition for rows outside the monthly ones. Queries for upcoming
+# shows only touch the current and future months. ``flask shows archive``
+# detaches whole past months from Show and attaches them to ShowArchive, a
+# metadata-only move, and ``flask shows partition`` creates the months ahead.
+# Other databases keep both as plain tables and archive by moving rows.
+
+PARTITION = re.compile(r"^Show_p(\d{4})_(\d{2})$")
+
+
+def is_partitioned():
+    if db.engine.dialect.name != "postgresql":
+        return False
+    return bool(
+        db.session.execute(
+            db.text(
+                "SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = '\"Show\"'::regclass"
+            )
+        ).first()
+    )
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return add_months(day, 1)
+
+
+def add_months(day, months):
+    """Return the first day of the month ``months`` after (or before) ``day``."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def ensure_partitions(through, today=None):
+    """Create the monthly Show partitions from this month up to ``through``.
+
+    Rows already in the DEFAULT partition for a new month are moved into it
+    first. Returns the names of the partitions created.
+    """
+    existing = set(_partitions("Show"))
+    created = []
+    month = month_start(today or date.today())
+    while month <= through:
+        name = partition_name("Show", month)
+        if name not in existing:
+            _create_partition(name, month, next_month(month))
+            created.append(name)
+        month = next_month(month)
+    return created
+
+
+def archive(before, tablespace=None):
+    """Move shows that started before ``before`` from Show to ShowArchive.
+
+    ``before`` is rounded down to a month boundary. Returns ``(months, rows)``:
+    the monthly partitions moved and the rows moved individually (all of
+    them when the tables are not partitioned).
+    """
+    before = month_start(before)
+    if not is_partitioned():
+        return [], _move_rows(Show.__table__, before)
+
+    months = []
+    for name in sorted(_partitions("Show")):
+        match = PARTITION.match(name)
+        if not match:
+            continue
+        month = date(int(match[1]), int(match[2]), 1)
+        if next_month(month) > before:
+            continue
+        archived = partition_name("ShowArchive", month)
+        db.session.execute(db.text(f'ALTER TABLE "Show" DETACH PARTITION "{name}"'))
+        db.session.execute(db.text(f'ALTER TABLE "{name}" RENAME TO "{archived}"'))
+        if tablespace:
+            db.session.execute(
+                db.text(f'ALTER TABLE "{archived}" SET TABLESPACE "{tablespace}"')
+            )
+        db.session.execute(
+            db.text(
+                f'ALTER TABLE "ShowArchive" ATTACH PARTITION "{archived}" '
+                f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}')"
+            )
+        )
+        months.append(month)
+
+    return months, _move_rows(db.table("Show_default", *_columns()), before)
+
+
+def _columns():
+    return [db.column(column.name) for column in Show.__table__.columns]
+
+
+def _move_rows(table, before):
+    archive = ShowArchive.__table__
+    names = [column.name for column in Show.__table__.columns]
+    old = db.select(*(table.c[name] for name in names)).where(
+        table.c.start_time < before
+    )
+    db.session.execute(archive.insert().from_select(names, old))
+    return db.session.execute(
+        table.delete().where(table.c.start_time < before)
+    ).rowcount
+
+
+def _partitions(parent):
+    return (
+        db.session.execute(
+            db.text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:parent AS regclass)"
+            ),
+            {"parent": f'"{parent}"'},
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _create_partition(name, start, end):
+    # Inserts into the DEFAULT partition wait until the new month is
+    # attached, so none can land in its range in between.
+    db.session.execute(db.text('LOCK TABLE "Show_default" IN SHARE ROW EXCLUSIVE MODE'))
+    db.session.execute(
+        db.text(
+            f'CREATE TABLE "{name}" '
+            '(LIKE "Show" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+    )
+    db.session.execute(
+        db.text(
+            "WITH moved AS ("
+            'DELETE FROM "Show_default" '
+            "WHERE start_time >= :start AND start_time < :end "
+            "RETURNING id, start_time, artist_id, venue_id) "
+            f'INSERT INTO "{name}" (id, start_time, artist_id, venue_id) '
+            "SELECT id, start_time, artist_id, venue_id FROM moved"
+        ),
+        {"start": start, "end": end},
+    )
+    db.session.execute(
+        db.text(
+            f'ALTER TABLE "Show" ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+    )
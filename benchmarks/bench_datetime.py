@@ -0,0 +1,70 @@
+"""Per-call cost of the ``datetime`` template filter on a 100k-row list.
+
+Run from the repository root::
+
+    python benchmarks/bench_datetime.py [--rows 100000] [--distinct 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from formatting import NAMED_FORMATS, DateTimeFormatter
+
+
+def legacy_format_datetime(value, format="medium"):
+    if isinstance(value, str):
+        date = dateutil.parser.parse(value)
+    else:
+        date = value
+    return babel.dates.format_datetime(
+        date, NAMED_FORMATS.get(format, format), locale="en"
+    )
+
+
+def make_rows(count, distinct, seed=0):
+    rng = random.Random(seed)
+    base = datetime(2022, 1, 1, 20, 0)
+    times = [base + timedelta(hours=rng.randrange(24 * 365 * 3)) for _ in range(distinct)]
+    return [rng.choice(times) for _ in range(count)]
+
+
+def run(label, func, rows, format):
+    started = time.perf_counter()
+    for value in rows:
+        func(value, format)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{label:<32} {elapsed:8.3f}s total {elapsed / len(rows) * 1e6:8.2f}us/call"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--distinct", type=int, default=5_000)
+    parser.add_argument("--format", default="full")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.distinct)
+    strings = [str(value) for value in rows]
+
+    compiled = DateTimeFormatter(cache_size=0)
+    cached = DateTimeFormatter()
+
+    run("legacy, str input", legacy_format_datetime, strings, args.format)
+    run("legacy, datetime input", legacy_format_datetime, rows, args.format)
+    run("compiled, no cache", compiled, rows, args.format)
+    run("compiled + LRU cache", cached, rows, args.format)
+    print(cached.cache_info())
+
+
+if __name__ == "__main__":
+    main()
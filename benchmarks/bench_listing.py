@@ -0,0 +1,126 @@
+"""Hydration time and memory of the artist and venue listings on 100k rows.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_listing [--rows 100000] [--repeat 5]
+
+Compares loading full ORM instances into per-row dicts (what ``/artists``
+used to do), ``load_only`` projections, and the Core column projections into
+``queries.Summary`` rows that the list and search pages use now. Generates a
+seeded dataset in a throwaway SQLite database unless --database is given;
+the target database is dropped and regenerated, so never point it at real
+data.
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def measure(db, func, repeat):
+    """Return ``(best seconds, peak bytes, retained bytes)`` for ``func()``."""
+    best = None
+    for _ in range(repeat):
+        db.session.remove()
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    db.session.remove()
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    del result
+    tracemalloc.stop()
+    return best, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", help="SQLAlchemy URL, dropped and refilled.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.database is None:
+        path = os.path.join(tempfile.gettempdir(), "fyyur-bench-listing.db")
+        args.database = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = args.database
+    os.environ["CACHE_BACKEND"] = "none"
+    os.environ.pop("DATABASE_REPLICA_URL", None)
+
+    from sqlalchemy.orm import load_only
+
+    from app import app, db
+    from models import Artist, Venue
+    from benchmarks import datagen
+    import queries
+
+    def orm(model):
+        return [{"id": row.id, "name": row.name} for row in model.query.all()]
+
+    def orm_load_only(model):
+        return [
+            {"id": row.id, "name": row.name}
+            for row in model.query.options(load_only(model.id, model.name))
+        ]
+
+    def legacy_areas():
+        rows = (
+            db.session.query(
+                Venue.state,
+                Venue.city,
+                Venue.id,
+                Venue.name,
+                Venue.upcoming_shows_count,
+            )
+            .order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+            .all()
+        )
+        areas = {}
+        for state, city, id, name, upcoming in rows:
+            areas.setdefault((state, city), []).append(
+                {"id": id, "name": name, "num_upcoming_shows": upcoming}
+            )
+        return [
+            {"city": city, "state": state, "venues": venues}
+            for (state, city), venues in areas.items()
+        ]
+
+    cases = [
+        ("artists: ORM + dicts", lambda: orm(Artist)),
+        ("artists: load_only + dicts", lambda: orm_load_only(Artist)),
+        ("artists: Core + Summary", lambda: queries.summaries(Artist)),
+        ("venues: ORM + dicts", lambda: orm(Venue)),
+        ("venues: Core + Summary", lambda: queries.summaries(Venue)),
+        ("venue areas: rows + dicts", legacy_areas),
+        ("venue areas: Area + Summary", queries.venue_areas),
+    ]
+
+    with app.app_context():
+        print(f"Generating {args.rows} venues and {args.rows} artists...", flush=True)
+        datagen.generate(
+            venues=args.rows, artists=args.rows, shows=args.rows, seed=args.seed
+        )
+
+        print(f"{'listing':<30} {'best ms':>9} {'peak MiB':>9} {'kept MiB':>9}")
+        for label, func in cases:
+            best, peak, retained = measure(db, func, args.repeat)
+            print(
+                f"{label:<30} {best * 1000:9.1f} "
+                f"{peak / 2**20:9.1f} {retained / 2**20:9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
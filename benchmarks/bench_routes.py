@@ -0,0 +1,429 @@
+"""Latency, throughput and queries per request for every route.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_routes [--driver client|http] [--shows 300000]
+        [--baseline benchmarks/baseline.json] [--save-baseline]
+
+Generates a seeded dataset in a throwaway SQLite database unless --database
+is given. The target database is dropped and regenerated, so never point it
+at real data. With --baseline the run exits with status 1 when an endpoint's
+p50/p95/p99 or throughput regress by more than --tolerance, or when it runs
+more queries per request than the baseline recorded. Baselines are
+machine-specific, so none is committed: record one with --save-baseline
+on the machine that will compare against it. A missing baseline file is an
+error rather than a silent pass.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+# Sent with every request so the ops endpoints (/metrics etc.) answer.
+OPS_TOKEN = "bench"
+AUTHORIZATION = {"Authorization": f"Bearer {OPS_TOKEN}"}
+QUERY_COUNT = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+ENTITY_FORM = {
+    "city": "Austin",
+    "state": "TX",
+    "phone": "512-555-0100",
+    "genres": ["Jazz", "Blues"],
+    "facebook_link": "https://www.facebook.com/bench",
+    "image_link": "",
+    "website_link": "",
+    "seeking_description": "",
+}
+
+
+class Scenario:
+    def __init__(self, name, path, method="GET", data=None, json=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.json = json
+
+    def request(self, index):
+        """Return ``(path, form data, JSON body)`` for the ``index``-th request."""
+        path = self.path(index) if callable(self.path) else self.path
+        data = self.data(index) if callable(self.data) else self.data
+        body = self.json(index) if callable(self.json) else self.json
+        return path, data, body
+
+
+def read_scenarios(venue_ids, artist_ids):
+    def venue(index):
+        return venue_ids[index % len(venue_ids)]
+
+    def artist(index):
+        return artist_ids[index % len(artist_ids)]
+
+    return [
+        Scenario("index", "/"),
+        Scenario("venues", "/venues"),
+        Scenario("show_venue", lambda i: f"/venues/{venue(i)}"),
+        Scenario(
+            "search_venues",
+            "/venues/search",
+            "POST",
+            lambda i: {"search_term": ["the", "blue", "hall", "owl"][i % 4]},
+        ),
+        Scenario("create_venue_form", "/venues/create"),
+        Scenario("edit_venue", lambda i: f"/venues/{venue(i)}/edit"),
+        Scenario("artists", "/artists"),
+        Scenario("show_artist", lambda i: f"/artists/{artist(i)}"),
+        Scenario(
+            "search_artists",
+            "/artists/search",
+            "POST",
+            lambda i: {"search_term": ["ada", "kim", "zeke", "a"][i % 4]},
+        ),
+        Scenario("create_artist_form", "/artists/create"),
+        Scenario("edit_artist", lambda i: f"/artists/{artist(i)}/edit"),
+        Scenario("shows", "/shows"),
+        Scenario("shows_upcoming", "/shows?when=upcoming"),
+        Scenario("create_shows", "/shows/create"),
+        Scenario("venue_matches", lambda i: f"/venues/{venue(i)}/matches"),
+        Scenario("artist_matches", lambda i: f"/artists/{artist(i)}/matches"),
+        Scenario("venue_calendar", lambda i: f"/venues/{venue(i)}/calendar"),
+        Scenario("artist_calendar", lambda i: f"/artists/{artist(i)}/calendar"),
+        Scenario(
+            "suggest",
+            lambda i: "/api/suggest?"
+            + urlencode(
+                {
+                    "type": ("venue", "artist")[i % 2],
+                    "q": ["th", "bl", "ad", "ki"][i % 4],
+                }
+            ),
+        ),
+        Scenario("cache_stats", "/cache/stats"),
+        Scenario("db_stats", "/db/stats"),
+        Scenario("metrics", "/metrics"),
+        Scenario("api_venues_page", "/api/v1/venues?limit=100"),
+        Scenario("api_venue", lambda i: f"/api/v1/venues/{venue(i)}"),
+        Scenario("api_artists_page", "/api/v1/artists?limit=100"),
+        Scenario("api_artist", lambda i: f"/api/v1/artists/{artist(i)}"),
+        Scenario("api_shows_page", "/api/v1/shows?limit=100&when=upcoming"),
+        Scenario("api_show", lambda i: f"/api/v1/shows/{i % 1000 + 1}"),
+        Scenario("api_venue_facets", "/api/v1/venues/facets?genre=Jazz&limit=100"),
+        Scenario(
+            "api_artist_facets", "/api/v1/artists/facets?state=CA&seeking=1&limit=100"
+        ),
+        Scenario("api_venue_calendar", lambda i: f"/api/v1/venues/{venue(i)}/calendar"),
+        Scenario(
+            "api_artist_heatmap", lambda i: f"/api/v1/artists/{artist(i)}/heatmap"
+        ),
+        Scenario(
+            "api_venue_heatmap_weeks",
+            lambda i: f"/api/v1/venues/{venue(i)}/heatmap?by=week",
+        ),
+    ]
+
+
+def write_scenarios(venue_ids, artist_ids, start_time):
+    def venue(index):
+        return venue_ids[index % len(venue_ids)]
+
+    def artist(index):
+        return artist_ids[index % len(artist_ids)]
+
+    def batch(index):
+        # Ten shows, each a day after the last, mostly clear of each other.
+        first = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
+        return [
+            {
+                "venue_id": venue(index + n),
+                "artist_id": artist(index + n),
+                "start_time": (first + timedelta(days=index * 10 + n)).isoformat(),
+            }
+            for n in range(10)
+        ]
+
+    return [
+        Scenario(
+            "create_venue_submission",
+            "/venues/create",
+            "POST",
+            lambda i: {
+                **ENTITY_FORM,
+                "name": f"Bench Venue {i}",
+                "address": "1 Bench Street",
+            },
+        ),
+        Scenario(
+            "create_artist_submission",
+            "/artists/create",
+            "POST",
+            lambda i: {**ENTITY_FORM, "name": f"Bench Artist {i}"},
+        ),
+        Scenario(
+            "edit_venue_submission",
+            lambda i: f"/venues/{venue(i)}/edit",
+            "POST",
+            lambda i: {**ENTITY_FORM, "name": f"Venue {venue(i)}", "address": "2 St"},
+        ),
+        Scenario(
+            "edit_artist_submission",
+            lambda i: f"/artists/{artist(i)}/edit",
+            "POST",
+            lambda i: {**ENTITY_FORM, "name": f"Artist {artist(i)}"},
+        ),
+        Scenario(
+            "create_show_submission",
+            "/shows/create",
+            "POST",
+            lambda i: {
+                "venue_id": venue(i),
+                "artist_id": artist(i),
+                "start_time": start_time,
+            },
+        ),
+        Scenario("create_shows_batch", "/shows/batch", "POST", json=batch),
+    ]
+
+
+def delete_scenario(venue_ids):
+    return Scenario(
+        "delete_venue",
+        lambda i: f"/venues/{venue_ids[i % len(venue_ids)]}",
+        "DELETE",
+    )
+
+
+def run_client(app, scenario, requests):
+    client = app.test_client()
+    latencies, queries = [], 0
+    started = time.perf_counter()
+    for index in range(requests):
+        path, data, body = scenario.request(index)
+        request_started = time.perf_counter()
+        response = client.open(
+            path, method=scenario.method, data=data, json=body, headers=AUTHORIZATION
+        )
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+        queries += _query_count(response.headers.get("Server-Timing", ""))
+    return latencies, queries, time.perf_counter() - started
+
+
+def run_http(server, scenario, requests, concurrency):
+    host, port = server.server_address[:2]
+    lock = threading.Lock()
+    latencies, totals = [], {"queries": 0}
+
+    def worker(indexes):
+        connection = http.client.HTTPConnection(host, port)
+        for index in indexes:
+            path, data, body = scenario.request(index)
+            if body is not None:
+                body = json.dumps(body)
+                headers = {"Content-Type": "application/json"}
+            else:
+                body = urlencode(data, doseq=True) if data else None
+                headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            headers.update(AUTHORIZATION)
+            request_started = time.perf_counter()
+            connection.request(scenario.method, path, body, headers)
+            response = connection.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - request_started
+            count = _query_count(response.getheader("Server-Timing", ""))
+            with lock:
+                latencies.append(elapsed)
+                totals["queries"] += count
+            if response.getheader("Connection", "").lower() == "close":
+                connection.close()
+                connection = http.client.HTTPConnection(host, port)
+        connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for _ in executor.map(
+            worker, [range(n, requests, concurrency) for n in range(concurrency)]
+        ):
+            pass
+    return latencies, totals["queries"], time.perf_counter() - started
+
+
+def _query_count(server_timing):
+    match = QUERY_COUNT.search(server_timing)
+    return int(match.group(1)) if match else 0
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(latencies, queries, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "queries": round(queries / len(latencies), 2),
+    }
+
+
+def regressions(results, baseline, tolerance):
+    problems = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if result[key] > base[key] * (1 + tolerance):
+                problems.append(f"{name}: {key} {base[key]} -> {result[key]}")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{name}: rps {base['rps']} -> {result['rps']}")
+        if result["queries"] > base["queries"]:
+            problems.append(f"{name}: queries {base['queries']} -> {result['queries']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", help="SQLAlchemy URL, dropped and refilled.")
+    parser.add_argument("--venues", type=int, default=2_000)
+    parser.add_argument("--artists", type=int, default=5_000)
+    parser.add_argument("--shows", type=int, default=300_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--driver", choices=["client", "http"], default="client")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cache", default="none", help="CACHE_BACKEND to use.")
+    parser.add_argument("--no-writes", dest="writes", action="store_false")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against.")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", help="Write the results as JSON.")
+    args = parser.parse_args()
+
+    if args.baseline and not args.save_baseline and not os.path.exists(args.baseline):
+        parser.error(f"no baseline at {args.baseline}; record one with --save-baseline")
+
+    if args.database is None:
+        path = os.path.join(tempfile.gettempdir(), "fyyur-bench.db")
+        args.database = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = args.database
+    os.environ["CACHE_BACKEND"] = args.cache
+    os.environ["OPS_TOKEN"] = OPS_TOKEN
+    for name in ("DATABASE_REPLICA_URL", "PROFILE_SAMPLE_RATE", "PROFILE_SECRET"):
+        os.environ.pop(name, None)
+
+    from app import app, db
+    from models import Venue
+    from benchmarks import datagen
+
+    app.config.update(DEBUG=False, WTF_CSRF_ENABLED=False)
+    app.debug = False
+    app.logger.setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    with app.app_context():
+        print(
+            f"Generating {args.venues} venues, {args.artists} artists, "
+            f"{args.shows} shows...",
+            flush=True,
+        )
+        now = datagen.generate(
+            venues=args.venues, artists=args.artists, shows=args.shows, seed=args.seed
+        )
+
+    rng = random.Random(args.seed)
+    venue_ids = rng.sample(range(1, args.venues + 1), min(50, args.venues))
+    artist_ids = rng.sample(range(1, args.artists + 1), min(50, args.artists))
+    scenarios = read_scenarios(venue_ids, artist_ids)
+    if args.writes:
+        start_time = (now + timedelta(days=365)).strftime("%Y-%m-%d %H:%M:%S")
+        scenarios += write_scenarios(venue_ids, artist_ids, start_time)
+
+    server = None
+    if args.driver == "http":
+        from werkzeug.serving import make_server
+
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def run(scenario, requests):
+        if server is None:
+            return run_client(app, scenario, requests)
+        return run_http(server, scenario, requests, args.concurrency)
+
+    results = {}
+    print(
+        f"{'endpoint':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'req/s':>9} {'queries':>8}"
+    )
+    for scenario in scenarios:
+        if args.warmup:
+            run(scenario, args.warmup)
+        results[scenario.name] = report(scenario, run(scenario, args.requests))
+
+    if args.writes:
+        # Delete the venues the create scenario added, so every request
+        # removes a real row.
+        with app.app_context():
+            created = [
+                id
+                for id, in db.session.query(Venue.id)
+                .filter(Venue.name.like("Bench Venue %"))
+                .order_by(Venue.id)
+            ]
+        if created:
+            scenario = delete_scenario(created)
+            results[scenario.name] = report(scenario, run(scenario, len(created)))
+
+    if server is not None:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        missing = sorted(set(results) - set(baseline))
+        if missing:
+            print(f"Not in the baseline, not compared: {', '.join(missing)}")
+        problems = regressions(results, baseline, args.tolerance)
+        if problems:
+            print("Regressions:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print("No regressions.")
+
+
+def report(scenario, run_result):
+    result = summarize(*run_result)
+    print(
+        f"{scenario.name:<26} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+        f"{result['p99_ms']:>9} {result['rps']:>9} {result['queries']:>8}",
+        flush=True,
+    )
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Seeded generator for realistic benchmark datasets.
+
+Imports the app, so ``DATABASE_URL`` must point at the benchmark database
+before this module is imported (bench_routes.py takes care of that).
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from app import db
+from forms import VenueForm
+from models import Artist, Genre, Show, Venue, genre_artist_table, genre_venue_table
+import search
+import show_counters
+
+GENRES = [value for value, _ in VenueForm.genres.kwargs["choices"]]
+
+# (city, state, weight): a few big markets and a long tail of small ones.
+CITIES = [
+    ("New York", "NY", 30),
+    ("Los Angeles", "CA", 25),
+    ("San Francisco", "CA", 20),
+    ("Chicago", "IL", 18),
+    ("Austin", "TX", 15),
+    ("Nashville", "TN", 15),
+    ("Seattle", "WA", 12),
+    ("New Orleans", "LA", 12),
+    ("Atlanta", "GA", 10),
+    ("Denver", "CO", 8),
+    ("Portland", "OR", 8),
+    ("Boston", "MA", 8),
+    ("Miami", "FL", 7),
+    ("Detroit", "MI", 6),
+    ("Minneapolis", "MN", 5),
+    ("Philadelphia", "PA", 5),
+    ("Phoenix", "AZ", 4),
+    ("Memphis", "TN", 4),
+    ("Brooklyn", "NY", 4),
+    ("Oakland", "CA", 3),
+    ("Asheville", "NC", 2),
+    ("Boise", "ID", 1),
+    ("Burlington", "VT", 1),
+    ("Anchorage", "AK", 1),
+]
+
+ADJECTIVES = (
+    "Blue Red Golden Silver Velvet Electric Midnight Lucky Wild Crooked "
+    "Rusty Little Grand Hidden Broken Neon Lonesome Sunset Iron Paper"
+).split()
+NOUNS = (
+    "Room Hall Tavern Cellar Lounge Garden Barn Palace Stage Den Club Owl "
+    "Rabbit Crow Anchor Lantern Mill Foundry Station Harbor"
+).split()
+FIRST_NAMES = (
+    "Ada Ben Cleo Dev Eli Fay Gus Hana Ivo June Kai Lena Milo Nia Otis Pia "
+    "Quinn Rosa Sam Tess Uma Vic Wren Xavi Yara Zeke"
+).split()
+LAST_NAMES = (
+    "Adams Brooks Cruz Diaz Ellis Fox Gray Hayes Ito Jones Kim Lopez Moss "
+    "Nash Owens Park Reed Shaw Tran Vega Webb Young"
+).split()
+
+CHUNK_SIZE = 10_000
+
+
+def generate(
+    venues=2_000,
+    artists=5_000,
+    shows=300_000,
+    future_fraction=0.3,
+    seed=0,
+    now=None,
+):
+    """Drop and recreate every table, then fill them with seeded data.
+
+    Show start times are spread over the two years before ``now`` and the
+    year after it, ``future_fraction`` of them upcoming. Returns ``now``.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now().replace(microsecond=0)
+
+    db.drop_all()
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(db.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.session.commit()
+    db.create_all()
+
+    db.session.execute(
+        Genre.__table__.insert(),
+        [{"id": id, "name": name} for id, name in enumerate(GENRES, start=1)],
+    )
+
+    cities = [(city, state) for city, state, _ in CITIES]
+    weights = [weight for _, _, weight in CITIES]
+
+    def entity(id, name, seeking_column):
+        city, state = rng.choices(cities, weights)[0]
+        return {
+            "id": id,
+            "name": name,
+            "city": city,
+            "state": state,
+            "phone": f"{rng.randrange(200, 999)}-555-{rng.randrange(10000):04d}",
+            "image_link": f"https://images.example.com/{id}.jpg",
+            "facebook_link": f"https://www.facebook.com/{id}",
+            "website_link": f"https://example.com/{id}",
+            seeking_column: rng.random() < 0.3,
+            "seeking_description": "Looking for new collaborators.",
+        }
+
+    venue_rows = []
+    for id in range(1, venues + 1):
+        row = entity(
+            id,
+            f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {id}",
+            "looking_for_talent",
+        )
+        row["address"] = f"{rng.randrange(1, 9999)} {rng.choice(NOUNS)} Street"
+        venue_rows.append(row)
+    artist_rows = [
+        entity(
+            id,
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {id}",
+            "looking_for_venue",
+        )
+        for id in range(1, artists + 1)
+    ]
+    _insert(Venue.__table__, venue_rows)
+    _insert(Artist.__table__, artist_rows)
+
+    for table, column, count in (
+        (genre_venue_table, "venue", venues),
+        (genre_artist_table, "artist", artists),
+    ):
+        _insert(
+            table,
+            [
+                {"genre": genre, column: id}
+                for id in range(1, count + 1)
+                for genre in rng.sample(range(1, len(GENRES) + 1), rng.randint(1, 3))
+            ],
+        )
+
+    past_seconds = int(timedelta(days=730).total_seconds())
+    future_seconds = int(timedelta(days=365).total_seconds())
+    show_rows = []
+    for id in range(1, shows + 1):
+        if rng.random() < future_fraction:
+            offset = rng.randrange(60, future_seconds)
+        else:
+            offset = -rng.randrange(0, past_seconds)
+        show_rows.append(
+            {
+                "id": id,
+                "venue_id": rng.randint(1, venues),
+                "artist_id": rng.randint(1, artists),
+                "start_time": now + timedelta(seconds=offset),
+            }
+        )
+    _insert(Show.__table__, show_rows)
+
+    show_counters.recount(Venue, now)
+    show_counters.recount(Artist, now)
+    show_counters.recount_days(Venue)
+    show_counters.recount_days(Artist)
+    search.refresh(Venue)
+    search.refresh(Artist)
+
+    if db.engine.dialect.name == "postgresql":
+        for model in (Genre, Venue, Artist, Show):
+            name = model.__table__.name
+            db.session.execute(
+                db.text(
+                    f"SELECT setval(pg_get_serial_sequence('\"{name}\"', 'id'), "
+                    f'coalesce(max(id), 1)) FROM "{name}"'
+                )
+            )
+    db.session.commit()
+    return now
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start : start + CHUNK_SIZE])
@@ -0,0 +1,322 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request, session
+
+# Page responses are stored in buckets keyed by (endpoint, view args); each
+# bucket holds one entry per query string. Writes invalidate whole buckets,
+# e.g. invalidate("show_venue", venue_id=3) drops every variant of that page.
+# Entries are stored with the page version (the ETag) that conditional.py
+# computed for the request, and one read under a different version is a
+# miss. Writes made by other processes or by CLI commands bump the page
+# versions (see changes.py) without reaching this process's invalidations,
+# so this is what keeps a page rendered before them from being served under
+# its new ETag.
+
+
+class CacheEntry:
+    __slots__ = ("status", "headers", "body", "expires", "version")
+
+    def __init__(self, status, headers, body, expires, version=None):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+        self.version = version
+
+    def fresh(self, version):
+        # Entries pickled before the version slot existed have none set.
+        return self.expires > time.time() and getattr(self, "version", None) == version
+
+
+class MemoryBackend:
+    """In-process LRU bounded by entry count and total body size."""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, bucket, variant):
+        with self._lock:
+            entry = self._entries.get((bucket, variant))
+            if entry is not None:
+                self._entries.move_to_end((bucket, variant))
+            return entry
+
+    def set(self, bucket, variant, entry):
+        with self._lock:
+            self._discard((bucket, variant))
+            self._entries[(bucket, variant)] = entry
+            self._buckets.setdefault(bucket, set()).add(variant)
+            self._size += len(entry.body)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                self._discard(next(iter(self._entries)))
+
+    def delete_bucket(self, bucket):
+        with self._lock:
+            for variant in list(self._buckets.get(bucket, ())):
+                self._discard((bucket, variant))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._size = 0
+
+    def size(self):
+        return len(self._entries), self._size
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= len(entry.body)
+        bucket, variant = key
+        variants = self._buckets.get(bucket)
+        variants.discard(variant)
+        if not variants:
+            del self._buckets[bucket]
+
+
+class FileBackend:
+    """Entries pickled under a shared directory, one subdirectory per bucket.
+
+    Every worker process pointed at the same directory sees the same entries
+    and invalidations. Files are written to a temporary name and renamed into
+    place, so readers never see a partial entry. Each file's mtime is set to
+    its expiry time, and every ``prune_every`` writes a process removes the
+    expired files, then the soonest to expire until the directory holds at
+    most ``max_bytes``.
+    """
+
+    # Temporary files older than this were left by a writer that died.
+    STALE_TMP_SECONDS = 60
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, prune_every=100):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, bucket, variant):
+        try:
+            with open(self._path(bucket, variant), "rb") as file:
+                return pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def set(self, bucket, variant, entry):
+        bucket_dir = self._bucket_dir(bucket)
+        os.makedirs(bucket_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(entry, file, pickle.HIGHEST_PROTOCOL)
+        try:
+            os.utime(tmp_path, (entry.expires, entry.expires))
+            os.replace(tmp_path, self._path(bucket, variant))
+        except OSError:
+            os.unlink(tmp_path)
+
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.prune_every == 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        """Remove expired entries, then the soonest to expire over the cap."""
+        now = time.time()
+        entries, size = [], 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith(".tmp"):
+                    if stat.st_mtime < now - self.STALE_TMP_SECONDS:
+                        _unlink(path)
+                elif stat.st_mtime <= now:
+                    _unlink(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    size += stat.st_size
+
+        entries.sort()
+        for _, file_size, path in entries:
+            if size <= self.max_bytes:
+                break
+            _unlink(path)
+            size -= file_size
+
+        for name in os.listdir(self.directory):
+            try:
+                os.rmdir(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def delete_bucket(self, bucket):
+        bucket_dir = self._bucket_dir(bucket)
+        doomed = f"{bucket_dir}.{os.getpid()}.{threading.get_ident()}.deleted"
+        try:
+            os.rename(bucket_dir, doomed)
+        except OSError:
+            return
+        shutil.rmtree(doomed, ignore_errors=True)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def size(self):
+        entries = size = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".page"):
+                    entries += 1
+                    size += os.path.getsize(os.path.join(root, name))
+        return entries, size
+
+    def _bucket_dir(self, bucket):
+        return os.path.join(self.directory, _digest(bucket))
+
+    def _path(self, bucket, variant):
+        return os.path.join(self._bucket_dir(bucket), _digest(variant) + ".page")
+
+
+class ResponseCache:
+    """Caches rendered GET responses of the read-only pages.
+
+    Configured from ``CACHE_BACKEND`` (``"memory"``, ``"file"`` or
+    ``"none"``), ``CACHE_TIMEOUT`` and the backend specific ``CACHE_*``
+    settings. Entries also expire after ``CACHE_TIMEOUT`` seconds, and are
+    only served under the page version they were stored with, so cached
+    views go below ``conditional``, which sets ``g.page_version``.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.timeout = 60
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get("CACHE_BACKEND", "memory")
+        self.timeout = app.config.get("CACHE_TIMEOUT", 60)
+        if kind == "memory":
+            self.backend = MemoryBackend(
+                max_entries=app.config.get("CACHE_MAX_ENTRIES", 1024),
+                max_bytes=app.config.get("CACHE_MAX_BYTES", 64 * 1024 * 1024),
+            )
+        elif kind == "file":
+            self.backend = FileBackend(
+                app.config["CACHE_DIR"],
+                max_bytes=app.config.get("CACHE_MAX_BYTES", 256 * 1024 * 1024),
+            )
+        else:
+            self.backend = None
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(**view_args):
+            # Pages render pending flash messages, so they are never served
+            # from or stored in the cache.
+            if self.backend is None or "_flashes" in session:
+                return view(**view_args)
+
+            bucket = _bucket(request.endpoint, view_args)
+            variant = request.query_string
+            version = g.get("page_version")
+            entry = self.backend.get(bucket, variant)
+
+            if entry is not None and entry.fresh(version):
+                self._count("hits")
+                return Response(entry.body, entry.status, entry.headers)
+
+            self._count("misses")
+            response = make_response(view(**view_args))
+            if response.status_code == 200 and not response.direct_passthrough:
+                self.backend.set(
+                    bucket,
+                    variant,
+                    CacheEntry(
+                        response.status_code,
+                        list(response.headers),
+                        response.get_data(),
+                        time.time() + self.timeout,
+                        version,
+                    ),
+                )
+            return response
+
+        return wrapper
+
+    def invalidate(self, endpoint, **view_args):
+        if self.backend is not None:
+            self.backend.delete_bucket(_bucket(endpoint, view_args))
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        """Return the backend's size and this process's hit and miss counts.
+
+        /metrics sums the counts over every worker when METRICS_DIR is set.
+        """
+        entries, size = self.backend.size() if self.backend is not None else (0, 0)
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "pid": os.getpid(),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def _count(self, name):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def _bucket(endpoint, view_args):
+    return (
+        endpoint,
+        tuple(sorted((key, str(value)) for key, value in view_args.items())),
+    )
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _digest(value):
+    return hashlib.sha1(repr(value).encode()).hexdigest()
@@ -0,0 +1,116 @@
+from app import cache, db
+from models import Artist, Show, Venue
+import conditional
+import facets
+import matching
+import search
+import suggest
+
+# Called by the write handlers once their transaction has committed, so that
+# everything derived from venues, artists and shows can be refreshed. Each
+# hook lists the pages a write changes once, as (endpoint, view args), and
+# _touch() both bumps their page versions, which changes their ETags in every
+# worker, and drops them from this process's page cache. It also bumps any
+# other version keys it is given, such as search.VERSION_KEYS.
+
+
+def data_changed():
+    """Refresh state derived from the whole data set."""
+    conditional.bump()
+    cache.clear()
+    search.index.reset()
+    suggest.index.reset()
+    facets.index.reset()
+    matching.index.reset()
+
+
+def venue_saved(venue_id, created=False):
+    search.index.update(Venue, [venue_id])
+    suggest.index.update(Venue, [venue_id])
+    facets.index.update(Venue, [venue_id])
+    matching.index.update(Venue, [venue_id])
+    if created:
+        _touch([("venues", {})], [search.VERSION_KEYS[Venue]])
+    else:
+        _touch(
+            _venue_pages(venue_id, _artist_ids(venue_id)), [search.VERSION_KEYS[Venue]]
+        )
+
+
+def venue_deleted(venue_id, artist_ids):
+    search.index.remove(Venue, venue_id)
+    suggest.index.remove(Venue, venue_id)
+    facets.index.remove(Venue, venue_id)
+    matching.index.remove(Venue, venue_id)
+    _touch(_venue_pages(venue_id, artist_ids), [search.VERSION_KEYS[Venue]])
+
+
+def artist_saved(artist_id, created=False):
+    search.index.update(Artist, [artist_id])
+    suggest.index.update(Artist, [artist_id])
+    facets.index.update(Artist, [artist_id])
+    matching.index.update(Artist, [artist_id])
+    if created:
+        _touch([("artists", {})], [search.VERSION_KEYS[Artist]])
+    else:
+        _touch(
+            _artist_pages(artist_id, _venue_ids(artist_id)),
+            [search.VERSION_KEYS[Artist]],
+        )
+
+
+def shows_added(shows):
+    """``shows`` is an iterable of ``(venue_id, artist_id, start_time)``."""
+    matching.index.forget_results()
+    # The listings show upcoming show counts.
+    pages = [("shows", {}), ("venues", {}), ("artists", {})]
+    for venue_id, artist_id, _ in shows:
+        pages.append(("show_venue", {"venue_id": venue_id}))
+        pages.append(("show_artist", {"artist_id": artist_id}))
+    _touch(pages)
+
+
+def _venue_pages(venue_id, artist_ids):
+    pages = [("venues", {}), ("shows", {}), ("show_venue", {"venue_id": venue_id})]
+    pages.extend(("show_artist", {"artist_id": id}) for id in artist_ids)
+    return pages
+
+
+def _artist_pages(artist_id, venue_ids):
+    pages = [
+        ("artists", {}),
+        ("shows", {}),
+        ("show_artist", {"artist_id": artist_id}),
+    ]
+    pages.extend(("show_venue", {"venue_id": id}) for id in venue_ids)
+    return pages
+
+
+def _touch(pages, keys=()):
+    pages = {
+        conditional.page_key(endpoint, **args): (endpoint, args)
+        for endpoint, args in pages
+    }
+    conditional.bump([*pages, *keys])
+    for endpoint, args in pages.values():
+        cache.invalidate(endpoint, **args)
+
+
+def _artist_ids(venue_id):
+    return (
+        db.session.execute(
+            db.select(Show.artist_id).where(Show.venue_id == venue_id).distinct()
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _venue_ids(artist_id):
+    return (
+        db.session.execute(
+            db.select(Show.venue_id).where(Show.artist_id == artist_id).distinct()
+        )
+        .scalars()
+        .all()
+    )
@@ -0,0 +1,176 @@
+from datetime import date, datetime
+
+import click
+from flask.cli import AppGroup
+
+from app import app, db
+from models import Artist, Venue
+import archive
+import changes
+import importer
+import profiler
+import scheduling
+import show_counters
+
+shows_cli = AppGroup("shows", help="Maintenance tasks for shows.")
+
+
+@shows_cli.command("roll-forward")
+def roll_forward():
+    """Move shows whose start time has passed from upcoming to past.
+
+    Meant to run periodically, e.g. every minute from cron.
+    """
+    updated = show_counters.roll_forward(datetime.now())
+    db.session.commit()
+    if updated:
+        changes.data_changed()
+    click.echo(f"Recounted {updated} venues and artists.")
+
+
+@shows_cli.command("recount")
+def recount():
+    """Rebuild the show counters and daily rollups of every venue and artist."""
+    now = datetime.now()
+    updated = show_counters.recount(Venue, now) + show_counters.recount(Artist, now)
+    show_counters.recount_days(Venue)
+    show_counters.recount_days(Artist)
+    db.session.commit()
+    changes.data_changed()
+    click.echo(f"Recounted {updated} venues and artists.")
+
+
+@shows_cli.command("partition")
+@click.option("--months-ahead", default=12, show_default=True)
+def partition(months_ahead):
+    """Create the monthly Show partitions for the coming months (Postgres)."""
+    if not archive.is_partitioned():
+        raise click.ClickException("The Show table is not partitioned.")
+    created = archive.ensure_partitions(archive.add_months(date.today(), months_ahead))
+    db.session.commit()
+    click.echo(f"Created {len(created)} partitions.")
+
+
+@shows_cli.command("archive")
+@click.option(
+    "--before",
+    type=click.DateTime(["%Y-%m"]),
+    help="First month to keep in Show; defaults to ARCHIVE_AFTER_MONTHS ago.",
+)
+@click.option("--tablespace", help="Move archived partitions to this tablespace.")
+def archive_shows(before, tablespace):
+    """Move past shows from Show to ShowArchive.
+
+    On Postgres whole monthly partitions are detached from Show and attached
+    to ShowArchive; elsewhere the rows are copied and deleted.
+    """
+    this_month = archive.month_start(date.today())
+    if before is None:
+        before = archive.add_months(this_month, -app.config["ARCHIVE_AFTER_MONTHS"])
+    else:
+        before = before.date()
+    if before > this_month:
+        raise click.ClickException("Only months that have ended can be archived.")
+
+    months, rows = archive.archive(before, tablespace=tablespace)
+    db.session.commit()
+    changes.data_changed()
+    click.echo(f"Archived {len(months)} monthly partitions and {rows} other shows.")
+
+
+@shows_cli.command("schedule")
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--format",
+    "format",
+    type=click.Choice(["csv", "ndjson"]),
+    help="Input format; guessed from the file extension by default.",
+)
+def schedule(file, format):
+    """Book the shows in a CSV or NDJSON file in one transaction.
+
+    Rows need venue_id, artist_id and start_time. Rows with unknown ids or
+    that double-book a venue or artist are reported and skipped.
+    """
+    if format is None:
+        format = "csv" if file.name.lower().endswith(".csv") else "ndjson"
+
+    rows, unreadable = [], []
+    for line, row, error in importer.read_rows(file, format):
+        if error:
+            unreadable.append({"row": line, "status": "rejected", "error": error})
+        else:
+            rows.append((line, row))
+
+    report, accepted = scheduling.schedule_rows(rows, datetime.now())
+    db.session.commit()
+    changes.shows_added(accepted)
+
+    errors = click.get_text_stream("stderr")
+    for result in sorted(unreadable + report, key=lambda result: result["row"]):
+        if result["status"] == "rejected":
+            errors.write(f"line {result['row']}: {result['error']}\n")
+    rejected = len(unreadable) + len(report) - len(accepted)
+    click.echo(f"Scheduled {len(accepted)} shows, rejected {rejected}.")
+
+
+@app.cli.command("import")
+@click.argument("kind", type=click.Choice(["venues", "artists", "genres", "shows"]))
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--format",
+    "format",
+    type=click.Choice(["csv", "ndjson"]),
+    help="Input format; guessed from the file extension by default.",
+)
+@click.option("--chunk-size", default=5000, show_default=True)
+@click.option(
+    "--copy",
+    "use_copy",
+    is_flag=True,
+    help="Load shows with COPY, skipping the double-booking check.",
+)
+@click.option(
+    "--errors",
+    type=click.File("w", encoding="utf-8"),
+    default="-",
+    help="Where to report rejected rows (default: stderr).",
+)
+def import_data(kind, file, format, chunk_size, use_copy, errors):
+    """Bulk load venues, artists, genres or shows from CSV or NDJSON.
+
+    Venue and artist rows take the form fields (genres separated by ';') and
+    an optional id; show rows need venue_id, artist_id and start_time.
+    """
+    if format is None:
+        format = "csv" if file.name.lower().endswith(".csv") else "ndjson"
+    if errors.name == "<stdout>":
+        errors = click.get_text_stream("stderr")
+
+    rows = importer.read_rows(file, format)
+    report = importer.ImportReport(errors)
+
+    if kind == "genres":
+        importer.import_genres(rows, chunk_size, report)
+    elif kind == "shows":
+        importer.import_shows(rows, chunk_size, report, use_copy=use_copy)
+    else:
+        model = Venue if kind == "venues" else Artist
+        importer.import_entities(model, rows, chunk_size, report)
+
+    changes.data_changed()
+    click.echo(f"Imported {report.imported} {kind}, rejected {report.rejected}.")
+
+
+@app.cli.command("profile-header")
+@click.argument("path")
+@click.option("--ttl", default=300, show_default=True, help="Validity in seconds.")
+def profile_header(path, ttl):
+    """Print an X-Profile header value that profiles one request to PATH."""
+    secret = app.config.get("PROFILE_SECRET")
+    if not secret:
+        raise click.ClickException("PROFILE_SECRET is not set.")
+    click.echo(f"X-Profile: {profiler.sign(secret, path, ttl)}")
+
+
+app.cli.add_command(shows_cli)
@@ -0,0 +1,193 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, g, make_response, request, session
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import DataVersion, PageVersion, Show
+
+# Read pages carry an ETag and Last-Modified built from the global
+# DataVersion row, the page's own PageVersion row (keyed by page_key()) and
+# the show start times around "now" for the page's scope, since the
+# upcoming/past split changes when a show starts without any write.
+# Computing them costs one small indexed query, and a matching
+# If-None-Match / If-Modified-Since gets a 304 without running the view.
+# changes.py bumps the page versions a write affects, and the global one
+# for bulk writes such as CLI imports. The ETag is also left in
+# ``g.page_version`` for the page cache, which treats an entry stored under
+# another version as a miss, so only the affected pages are re-rendered,
+# in every worker.
+
+VERSION_ID = 1
+
+
+def page_key(endpoint, **view_args):
+    """Return the PageVersion key of one page, e.g. ``show_venue:3``."""
+    return ":".join([endpoint, *(str(view_args[name]) for name in sorted(view_args))])
+
+
+def bump(keys=None):
+    """Record a committed write; runs in its own transaction.
+
+    ``keys`` are the page keys the write affects; without them every page
+    changes.
+    """
+    now = datetime.utcnow()
+    if keys is None:
+        values = {"version": DataVersion.version + 1, "updated_at": now}
+        updated = DataVersion.query.filter_by(id=VERSION_ID).update(
+            values, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(DataVersion(id=VERSION_ID, version=1, updated_at=now))
+    elif keys:
+        _bump_pages(sorted(set(keys)), now)
+    db.session.commit()
+
+
+def versions(key):
+    """Return the global version and the version of page key ``key``."""
+    return tuple(
+        db.session.execute(
+            db.select(
+                db.select(DataVersion.version)
+                .where(DataVersion.id == VERSION_ID)
+                .scalar_subquery(),
+                db.select(PageVersion.version)
+                .where(PageVersion.key == key)
+                .scalar_subquery(),
+            )
+        ).one()
+    )
+
+
+def _bump_pages(keys, now):
+    table = PageVersion.__table__
+    dialect = db.engine.dialect.name
+    rows = [{"key": key, "version": 1, "updated_at": now} for key in keys]
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        db.session.execute(
+            insert.on_conflict_do_update(
+                index_elements=["key"],
+                set_={
+                    "version": table.c.version + 1,
+                    "updated_at": insert.excluded.updated_at,
+                },
+            ),
+            rows,
+        )
+        return
+
+    existing = set(
+        db.session.execute(db.select(table.c.key).where(table.c.key.in_(keys)))
+        .scalars()
+        .all()
+    )
+    db.session.execute(
+        table.update()
+        .where(table.c.key.in_(existing))
+        .values(version=table.c.version + 1, updated_at=now)
+    )
+    missing = [row for row in rows if row["key"] not in existing]
+    if missing:
+        db.session.execute(table.insert(), missing)
+
+
+def validators(key, show_filters=None):
+    """Return ``(etag, last_modified)`` for the page ``key``.
+
+    ``show_filters`` selects the shows whose start times the page depends on,
+    ``()`` meaning all shows; ``None`` means the page does not depend on time.
+    """
+    columns = [
+        db.select(DataVersion.version)
+        .where(DataVersion.id == VERSION_ID)
+        .scalar_subquery(),
+        db.select(DataVersion.updated_at)
+        .where(DataVersion.id == VERSION_ID)
+        .scalar_subquery(),
+        db.select(PageVersion.version).where(PageVersion.key == key).scalar_subquery(),
+        db.select(PageVersion.updated_at)
+        .where(PageVersion.key == key)
+        .scalar_subquery(),
+    ]
+    if show_filters is not None:
+        now = datetime.now()
+        columns += [
+            db.select(db.func.max(Show.start_time))
+            .where(Show.start_time <= now, *show_filters)
+            .scalar_subquery(),
+            db.select(db.func.min(Show.start_time))
+            .where(Show.start_time > now, *show_filters)
+            .scalar_subquery(),
+        ]
+    version, updated_at, page_version, page_updated_at, *boundaries = (
+        db.session.execute(db.select(*columns)).one()
+    )
+    last_start, next_start = boundaries or (None, None)
+
+    etag = hashlib.sha1(f"{version}|{page_version}|{next_start}".encode()).hexdigest()[
+        :20
+    ]
+
+    candidates = [datetime(1970, 1, 1, tzinfo=timezone.utc)]
+    for written in (updated_at, page_updated_at):
+        if written:
+            candidates.append(written.replace(tzinfo=timezone.utc))
+    if last_start:
+        # Show times are naive local times.
+        candidates.append(last_start.astimezone(timezone.utc))
+
+    return etag, max(candidates).replace(microsecond=0)
+
+
+def conditional(scope=None):
+    """Answer conditional GETs for a view with validators from ``scope``.
+
+    ``scope(**view_args)`` returns the Show filters the page depends on, see
+    ``validators``. Without a scope the page depends on writes only.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            # Pending flash messages are rendered into the page.
+            if "_flashes" in session:
+                return view(**view_args)
+
+            etag, last_modified = validators(
+                page_key(request.endpoint, **view_args),
+                scope(**view_args) if scope else None,
+            )
+            g.page_version = etag
+
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(**view_args))
+
+            if response.status_code in (200, 304):
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+
+    since = request.if_modified_since
+    if since is not None:
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+
+    return False
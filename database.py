@@ -0,0 +1,60 @@
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+
+# Read/write splitting. Views decorated with @read_only run their queries on
+# the "replica" bind when SQLALCHEMY_BINDS configures one; everything else,
+# and any flush, goes to the primary.
+
+REPLICA = "replica"
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        if (
+            has_app_context()
+            and g.get("read_only")
+            and not self._flushing
+            and REPLICA in (self.app.config.get("SQLALCHEMY_BINDS") or {})
+        ):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def pool_stats(self, app):
+        """Return the pool status of the primary and every bind."""
+        binds = [None] + list(app.config.get("SQLALCHEMY_BINDS") or {})
+        stats = {}
+        for bind in binds:
+            pool = self.get_engine(app, bind=bind).pool
+            entry = {"pool": type(pool).__name__, "status": pool.status()}
+            if hasattr(pool, "checkedout"):
+                entry.update(
+                    size=pool.size(),
+                    checked_out=pool.checkedout(),
+                    checked_in=pool.checkedin(),
+                    overflow=pool.overflow(),
+                )
+            stats[bind or "primary"] = entry
+        return stats
+
+
+def read_only(view):
+    """Run ``view``'s queries on the replica, if there is one.
+
+    The flag lives on ``g`` for the rest of the request, so streamed
+    response bodies keep reading from the replica too.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,227 @@
+import threading
+
+from app import db
+from models import Artist, Genre, Venue, genre_artist_table, genre_venue_table
+
+# Browse-by-facet for venues and artists. Each genre, state, city and the
+# seeking flag has a bitmap of matching entity ids (a Python int with bit
+# ``id`` set), so "Jazz AND Blues venues in CA looking for talent" is a few
+# ANDs over in-memory integers instead of many-to-many joins, and counts are
+# popcounts. Built from the database on first use, one bytearray per bitmap
+# so the build stays linear in the number of rows, and kept current by
+# changes.py.
+
+FACETS = {
+    Venue: (genre_venue_table, "venue", Venue.looking_for_talent),
+    Artist: (genre_artist_table, "artist", Artist.looking_for_venue),
+}
+
+
+class _ModelFacets:
+    def __init__(self):
+        self.all = 0
+        self.seeking = 0
+        self.values = {"genre": {}, "state": {}, "city": {}}
+        self.keys = {}
+
+    @classmethod
+    def build(cls, rows):
+        """Build from ``(id, city, state, seeking, genres)`` rows."""
+        facets = cls()
+        members = {facet: {} for facet in facets.values}
+        all_ids, seeking_ids = [], []
+        for id, city, state, seeking, genres in rows:
+            keys = _keys(city, state, genres)
+            for facet, value in keys:
+                members[facet].setdefault(value, []).append(id)
+            facets.keys[id] = keys
+            all_ids.append(id)
+            if seeking:
+                seeking_ids.append(id)
+
+        facets.all = _bitmap(all_ids)
+        facets.seeking = _bitmap(seeking_ids)
+        facets.values = {
+            facet: {value: _bitmap(ids) for value, ids in values.items()}
+            for facet, values in members.items()
+        }
+        return facets
+
+    def add(self, id, city, state, seeking, genres):
+        self.remove(id)
+        bit = 1 << id
+        keys = _keys(city, state, genres)
+        for facet, value in keys:
+            bitmaps = self.values[facet]
+            bitmaps[value] = bitmaps.get(value, 0) | bit
+        self.keys[id] = keys
+        self.all |= bit
+        if seeking:
+            self.seeking |= bit
+
+    def remove(self, id):
+        keys = self.keys.pop(id, None)
+        if keys is None:
+            return
+        mask = ~(1 << id)
+        for facet, value in keys:
+            bitmaps = self.values[facet]
+            bitmaps[value] &= mask
+            if not bitmaps[value]:
+                del bitmaps[value]
+        self.all &= mask
+        self.seeking &= mask
+
+    def select(self, genres=(), states=(), cities=(), seeking=None):
+        """Return the bitmap of ids matching every given facet.
+
+        All ``genres`` must match; ``states`` and ``cities`` match any of
+        their values.
+        """
+        selection = self.all
+        for genre in genres:
+            selection &= self.values["genre"].get(genre, 0)
+        for facet, values in (("state", states), ("city", cities)):
+            if values:
+                bitmaps = self.values[facet]
+                any_value = 0
+                for value in values:
+                    any_value |= bitmaps.get(value, 0)
+                selection &= any_value
+        if seeking is not None:
+            selection &= self.seeking if seeking else ~self.seeking
+        return selection
+
+    def counts(self, selection):
+        """Count ``selection`` against every facet value, for refining it."""
+        counts = {
+            facet: {
+                value: count
+                for value, count in sorted(
+                    (value, (bitmap & selection).bit_count())
+                    for value, bitmap in bitmaps.items()
+                )
+                if count
+            }
+            for facet, bitmaps in self.values.items()
+        }
+        seeking = (self.seeking & selection).bit_count()
+        counts["seeking"] = {
+            "true": seeking,
+            "false": selection.bit_count() - seeking,
+        }
+        return counts
+
+
+class FacetIndex:
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        # Serializes builds, which run outside _lock; every write bumps
+        # _version so a build that overlapped one is used once, not kept.
+        self._building = threading.Lock()
+        self._version = 0
+
+    def query(self, model, genres=(), states=(), cities=(), seeking=None):
+        """Return ``(selection, counts)`` for the given facet filters."""
+        facets = self._facets(model)
+        with self._lock:
+            selection = facets.select(genres, states, cities, seeking)
+            return selection, facets.counts(selection)
+
+    def update(self, model, ids):
+        rows = None
+        if model in self._models:
+            rows = list(_rows(model, ids))
+        with self._lock:
+            self._version += 1
+            facets = self._models.get(model)
+            if facets is None:
+                return
+            if rows is None:
+                # Built after the check above, possibly without this write.
+                del self._models[model]
+                return
+            for row in rows:
+                facets.add(*row)
+
+    def remove(self, model, id):
+        with self._lock:
+            self._version += 1
+            facets = self._models.get(model)
+            if facets is not None:
+                facets.remove(id)
+
+    def reset(self):
+        with self._lock:
+            self._version += 1
+            self._models.clear()
+
+    def _facets(self, model):
+        facets = self._models.get(model)
+        if facets is not None:
+            return facets
+        with self._building:
+            with self._lock:
+                facets = self._models.get(model)
+                version = self._version
+            if facets is not None:
+                return facets
+            facets = _ModelFacets.build(_rows(model))
+            with self._lock:
+                if self._version == version:
+                    self._models[model] = facets
+            return facets
+
+
+def _keys(city, state, genres):
+    keys = [("state", state), ("city", city)] + [("genre", genre) for genre in genres]
+    return [(facet, value) for facet, value in keys if value]
+
+
+def _bitmap(ids):
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for id in ids:
+        buffer[id >> 3] |= 1 << (id & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _rows(model, ids=None):
+    """Yield ``(id, city, state, seeking, genres)`` for ``ids`` or every row."""
+    table, column, seeking_column = FACETS[model]
+    entity_column = table.c[column]
+    rows = db.select(model.id, model.city, model.state, seeking_column)
+    genre_rows = db.select(entity_column, Genre.name).join(
+        Genre, Genre.id == table.c.genre
+    )
+    if ids is not None:
+        ids = list(ids)
+        rows = rows.where(model.id.in_(ids))
+        genre_rows = genre_rows.where(entity_column.in_(ids))
+
+    genres = {}
+    for id, name in db.session.execute(genre_rows):
+        genres.setdefault(id, []).append(name)
+    for id, city, state, seeking in db.session.execute(rows):
+        yield id, city, state, seeking, genres.get(id, ())
+
+
+def ids(selection, after=0, limit=None):
+    """Return the ids set in ``selection`` above ``after``, in order."""
+    selection >>= after + 1
+    found = []
+    for position, byte in enumerate(
+        selection.to_bytes((selection.bit_length() + 7) // 8, "little")
+    ):
+        while byte:
+            low = byte & -byte
+            found.append(after + 1 + position * 8 + low.bit_length() - 1)
+            if limit is not None and len(found) >= limit:
+                return found
+            byte ^= low
+    return found
+
+
+index = FacetIndex()
@@ -0,0 +1,59 @@
+from functools import lru_cache
+
+import dateutil.parser
+from babel import Locale
+from babel.dates import (
+    get_date_format,
+    get_datetime_format,
+    get_time_format,
+    parse_pattern,
+)
+
+# Named formats used by the templates, on top of babel's "long"/"short".
+NAMED_FORMATS = {
+    "full": "EEEE MMMM, d, y 'at' h:mma",
+    "medium": "EE MM, dd, y h:mma",
+}
+
+
+class DateTimeFormatter:
+    """Callable datetime formatter used as the ``datetime`` Jinja filter.
+
+    The locale and every pattern are parsed once and kept, and the most
+    recently rendered ``(value, format)`` pairs are memoized in a bounded LRU
+    cache. Strings are still accepted and parsed with dateutil, but datetimes
+    are formatted directly.
+    """
+
+    def __init__(self, locale="en", cache_size=4096):
+        self.locale = Locale.parse(locale)
+        self._patterns = {}
+        self.render = lru_cache(maxsize=cache_size)(self._render)
+
+    def __call__(self, value, format="medium"):
+        if isinstance(value, str):
+            value = dateutil.parser.parse(value)
+        return self.render(value, format)
+
+    def pattern(self, format):
+        pattern = self._patterns.get(format)
+        if pattern is None:
+            pattern = self._patterns[format] = parse_pattern(self._expand(format))
+        return pattern
+
+    def cache_info(self):
+        return self.render.cache_info()
+
+    def _expand(self, format):
+        if format in NAMED_FORMATS:
+            return NAMED_FORMATS[format]
+        if format in ("long", "short"):
+            return (
+                get_datetime_format(format, locale=self.locale)
+                .replace("{0}", get_time_format(format, locale=self.locale).pattern)
+                .replace("{1}", get_date_format(format, locale=self.locale).pattern)
+            )
+        return format
+
+    def _render(self, value, format):
+        return self.pattern(format).apply(value, self.locale)
@@ -0,0 +1,96 @@
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import make_transient_to_detached
+
+from app import db
+from models import Genre
+
+
+class GenreRegistry:
+    """Resolves genre names to ``Genre`` rows with a warm name -> id cache.
+
+    Unknown names are upserted in one ``INSERT ... ON CONFLICT DO NOTHING``
+    and read back with one ``SELECT ... WHERE name IN (...)``, both on their
+    own short transaction so only committed ids are ever cached. Known names
+    are attached to the session without touching the database.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def ids(self, names):
+        """Return a ``{name: id}`` mapping for ``names``, creating missing genres."""
+        names = list(dict.fromkeys(name for name in names if name))
+        missing = [name for name in names if name not in self._ids]
+
+        if missing:
+            self._load(missing)
+
+        return {name: self._ids[name] for name in names}
+
+    def resolve(self, names):
+        """Return persistent ``Genre`` instances for ``names``, in order."""
+        return [self._attach(id, name) for name, id in self.ids(names).items()]
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._ids.clear()
+            else:
+                self._ids.pop(name, None)
+
+    def _load(self, names):
+        table = Genre.__table__
+        rows = [{"name": name} for name in names]
+
+        with db.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+                connection.execute(
+                    insert(table).on_conflict_do_nothing(index_elements=["name"]),
+                    rows,
+                )
+            else:
+                existing = {
+                    name
+                    for (name,) in connection.execute(
+                        db.select(table.c.name).where(table.c.name.in_(names))
+                    )
+                }
+                new_rows = [row for row in rows if row["name"] not in existing]
+                if new_rows:
+                    connection.execute(table.insert(), new_rows)
+
+            found = connection.execute(
+                db.select(table.c.id, table.c.name).where(table.c.name.in_(names))
+            ).all()
+
+        with self._lock:
+            self._ids.update((name, id) for id, name in found)
+
+    def _attach(self, id, name):
+        genre = Genre(id=id, name=name)
+        make_transient_to_detached(genre)
+        return db.session.merge(genre, load=False)
+
+
+registry = GenreRegistry()
+
+
+@event.listens_for(Genre, "after_insert")
+def _forget_inserted_genre(mapper, connection, genre):
+    registry.invalidate(genre.name)
+
+
+@event.listens_for(Genre, "after_update")
+@event.listens_for(Genre, "after_delete")
+def _forget_all_genres(mapper, connection, genre):
+    registry.invalidate()
+
+
+def resolve(names):
+    return registry.resolve(names)
@@ -0,0 +1,400 @@
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from models import Artist, Venue, genre_artist_table, genre_venue_table
+import genre_registry
+import scheduling
+import search
+import show_counters
+
+# Bulk loader behind ``flask import``. Rows are read lazily from CSV or NDJSON
+# files and written in chunks: each chunk is validated in Python, has its
+# genres and foreign keys resolved with one query per kind, is inserted with
+# executemany (or COPY on Postgres) and is committed on its own. Rejected rows
+# are reported with their line number and never abort the import: each chunk
+# is written inside a savepoint, and a chunk the database refuses is retried
+# row by row so only the offending rows are rejected. Shows go
+# through scheduling.py's double-booking check, except with --copy, which
+# only checks that the venue and artist exist.
+
+TRUE_VALUES = ("1", "true", "t", "yes", "y")
+
+ENTITY_FIELDS = {
+    Venue: (
+        "name",
+        "city",
+        "state",
+        "address",
+        "phone",
+        "image_link",
+        "facebook_link",
+        "website_link",
+        "seeking_description",
+    ),
+    Artist: (
+        "name",
+        "city",
+        "state",
+        "phone",
+        "image_link",
+        "facebook_link",
+        "website_link",
+        "seeking_description",
+    ),
+}
+
+SEEKING_FIELDS = {
+    Venue: ("seeking_talent", "looking_for_talent"),
+    Artist: ("seeking_venue", "looking_for_venue"),
+}
+
+GENRE_TABLES = {
+    Venue: (genre_venue_table, "venue"),
+    Artist: (genre_artist_table, "artist"),
+}
+
+
+class ImportReport:
+    def __init__(self, errors=None):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = errors
+
+    def reject(self, line, reason):
+        self.rejected += 1
+        if self.errors is not None:
+            self.errors.write(f"line {line}: {reason}\n")
+
+
+def read_rows(file, format):
+    """Yield ``(line, row, error)`` for each record of a CSV or NDJSON file."""
+    if format == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as error:
+            yield line, None, f"invalid JSON: {error}"
+            continue
+        if isinstance(row, dict):
+            yield line, row, None
+        else:
+            yield line, None, "expected a JSON object"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_genres(rows, chunk_size, report):
+    for chunk in chunked(rows, chunk_size):
+        names = []
+        for line, row, error in chunk:
+            name = (row or {}).get("name")
+            if error or not name:
+                report.reject(line, error or "missing name")
+            else:
+                names.append(name.strip())
+        report.imported += len(genre_registry.registry.ids(names))
+
+
+def import_entities(model, rows, chunk_size, report):
+    table = model.__table__
+    association, column = GENRE_TABLES[model]
+
+    for chunk in chunked(rows, chunk_size):
+        parsed = []
+        for line, row, error in chunk:
+            if error:
+                report.reject(line, error)
+                continue
+            record, reason = _entity_record(model, row)
+            if reason:
+                report.reject(line, reason)
+                continue
+            parsed.append((line, record, _genre_names(row.get("genres"))))
+
+        # Explicit ids already taken, in the table or earlier in the chunk,
+        # would abort the whole chunk's insert.
+        taken = _existing_ids(
+            model, [record["id"] for _, record, _ in parsed if "id" in record]
+        )
+        accepted = []
+        for line, record, names in parsed:
+            if "id" in record:
+                if record["id"] in taken:
+                    report.reject(line, f"duplicate id {record['id']}")
+                    continue
+                taken.add(record["id"])
+            accepted.append((line, (record, names)))
+
+        if not accepted:
+            continue
+
+        # Genres are upserted on their own transaction, before this chunk
+        # starts writing.
+        genre_ids = genre_registry.registry.ids(
+            name for _, (_, names) in accepted for name in names
+        )
+
+        def write(items):
+            records = [record for record, _ in items]
+            ids = _insert_returning_ids(table, records)
+            links = [
+                {"genre": genre_ids[name], column: id}
+                for id, (_, names) in zip(ids, items)
+                for name in names
+            ]
+            if links:
+                db.session.execute(association.insert(), links)
+            return ids
+
+        ids = _write_chunk(accepted, write, report)
+        if ids:
+            search.refresh(model, ids)
+        db.session.commit()
+        report.imported += len(ids)
+
+
+def import_shows(rows, chunk_size, report, use_copy=False):
+    now = datetime.now()
+    copy = use_copy and db.engine.dialect.name == "postgresql"
+
+    for chunk in chunked(rows, chunk_size):
+        shows = []
+        for line, row, error in chunk:
+            if error:
+                report.reject(line, error)
+                continue
+            try:
+                shows.append(
+                    (
+                        line,
+                        int(row["venue_id"]),
+                        int(row["artist_id"]),
+                        datetime.fromisoformat(str(row["start_time"]).strip()),
+                    )
+                )
+            except (KeyError, TypeError, ValueError) as error:
+                report.reject(line, f"invalid show: {error!r}")
+
+        if not shows:
+            continue
+
+        if copy:
+            accepted = _copy_shows(shows, report)
+            show_counters.record_shows(accepted, now)
+        else:
+            accepted = _write_chunk(
+                [(show[0], show) for show in shows],
+                lambda items: _schedule_shows(items, report, now),
+                report,
+            )
+
+        db.session.commit()
+        report.imported += len(accepted)
+
+
+def _entity_record(model, row):
+    record = {}
+    for field in ENTITY_FIELDS[model]:
+        value = row.get(field)
+        record[field] = value.strip() if isinstance(value, str) else value
+
+    for field in ("name", "city", "state"):
+        if not record[field]:
+            return None, f"missing {field}"
+
+    seeking_field, column = SEEKING_FIELDS[model]
+    seeking = row.get(seeking_field)
+    if isinstance(seeking, str):
+        seeking = seeking.strip().lower() in TRUE_VALUES
+    record[column] = bool(seeking)
+
+    if row.get("id") not in (None, ""):
+        try:
+            record["id"] = int(row["id"])
+        except (TypeError, ValueError):
+            return None, f"invalid id {row['id']!r}"
+
+    return record, None
+
+
+def _genre_names(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace("|", ";").split(";")
+    return list(dict.fromkeys(name.strip() for name in value if name and name.strip()))
+
+
+def _write_chunk(rows, write, report):
+    """Run ``write`` over a chunk's items inside a savepoint.
+
+    ``rows`` holds ``(line, item)`` pairs and ``write(items)`` returns a list
+    of results. If the database rejects the chunk, each row is retried in
+    its own savepoint and the rows that still fail are reported.
+    """
+    try:
+        with db.session.begin_nested():
+            return write([item for _, item in rows])
+    except SQLAlchemyError:
+        pass
+
+    results = []
+    for line, item in rows:
+        try:
+            with db.session.begin_nested():
+                results.extend(write([item]))
+        except SQLAlchemyError as error:
+            report.reject(line, _database_error(error))
+    return results
+
+
+def _database_error(error):
+    message = str(getattr(error, "orig", None) or error).strip()
+    return f"database error: {message.splitlines()[0] if message else type(error).__name__}"
+
+
+def _insert_returning_ids(table, records):
+    """Insert ``records`` and return their ids in order."""
+    ids = [record.get("id") for record in records]
+
+    explicit = [record for record in records if "id" in record]
+    if explicit:
+        db.session.execute(table.insert(), explicit)
+        if db.engine.dialect.name == "postgresql":
+            _advance_sequence(table)
+
+    generated = [index for index, record in enumerate(records) if "id" not in record]
+    if not generated:
+        return ids
+
+    rows = [records[index] for index in generated]
+    if db.engine.dialect.name == "postgresql":
+        # A multi-row VALUES insert returns ids in row order on Postgres.
+        new_ids = (
+            db.session.execute(table.insert().values(rows).returning(table.c.id))
+            .scalars()
+            .all()
+        )
+    else:
+        # Deliberately one statement per row: other databases cannot return
+        # the ids of an executemany insert, and they only back development
+        # and tests, where imports are small.
+        new_ids = [
+            db.session.execute(table.insert(), row).inserted_primary_key[0]
+            for row in rows
+        ]
+
+    for index, id in zip(generated, new_ids):
+        ids[index] = id
+    return ids
+
+
+def _advance_sequence(table):
+    # Moves the id sequence past explicit ids just written, so the ids
+    # generated next cannot collide with them; it never moves backwards.
+    db.session.execute(
+        db.text(
+            "SELECT setval(seq, top) FROM ("
+            f"SELECT pg_get_serial_sequence('\"{table.name}\"', 'id') AS seq, "
+            f'max(id) AS top FROM "{table.name}") AS ids '
+            "WHERE top > coalesce(pg_sequence_last_value(seq::regclass), 0)"
+        )
+    )
+
+
+def _existing_ids(model, ids):
+    if not ids:
+        return set()
+    return set(
+        db.session.execute(db.select(model.id).where(model.id.in_(set(ids))))
+        .scalars()
+        .all()
+    )
+
+
+def _schedule_shows(shows, report, now):
+    results = scheduling.schedule([show[1:] for show in shows], now)
+    accepted = []
+    for (line, *_), result in zip(shows, results):
+        if result.scheduled:
+            accepted.append((result.venue_id, result.artist_id, result.start_time))
+        else:
+            report.reject(line, result.error)
+    return accepted
+
+
+def _copy_shows(shows, report):
+    # The staging table lives on the chunk's connection and is emptied by
+    # the chunk's commit.
+    db.session.execute(
+        db.text(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS show_import_staging "
+            "(line integer, venue_id integer, artist_id integer, "
+            "start_time timestamp) ON COMMIT DELETE ROWS"
+        )
+    )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line, venue_id, artist_id, start_time in shows:
+        writer.writerow((line, venue_id, artist_id, start_time.isoformat(" ")))
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY show_import_staging (line, venue_id, artist_id, start_time) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+    rejected = db.session.execute(
+        db.text(
+            "SELECT s.line, v.id IS NULL AS no_venue, s.venue_id, s.artist_id "
+            "FROM show_import_staging s "
+            'LEFT JOIN "Venue" v ON v.id = s.venue_id '
+            'LEFT JOIN "Artist" a ON a.id = s.artist_id '
+            "WHERE v.id IS NULL OR a.id IS NULL"
+        )
+    ).all()
+    db.session.execute(
+        db.text(
+            'INSERT INTO "Show" (venue_id, artist_id, start_time) '
+            "SELECT s.venue_id, s.artist_id, s.start_time "
+            "FROM show_import_staging s "
+            'JOIN "Venue" v ON v.id = s.venue_id '
+            'JOIN "Artist" a ON a.id = s.artist_id'
+        )
+    )
+
+    rejected_lines = set()
+    for line, no_venue, venue_id, artist_id in rejected:
+        rejected_lines.add(line)
+        if no_venue:
+            report.reject(line, f"unknown venue {venue_id}")
+        else:
+            report.reject(line, f"unknown artist {artist_id}")
+
+    return [show[1:] for show in shows if show[0] not in rejected_lines]
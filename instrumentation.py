@@ -0,0 +1,161 @@
+import json
+import re
+import time
+from collections import Counter
+
+from flask import g, has_app_context, request
+from flask.signals import before_render_template, signals_available, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request SQL and render accounting. Engine events record every cursor
+# execution into the current request's stats; the request hooks turn them
+# into a Server-Timing header and one structured log line, and warn when the
+# same statement shape repeats often enough to look like an N+1 pattern.
+
+# Collapses expanded IN lists and literals so "IN (?, ?)" and "IN (?, ?, ?)"
+# count as the same statement shape.
+PARAMETER_LIST = re.compile(
+    r"\(\s*(?:\?|%\(\w+\)s|%s|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|\$\d+))*\s*\)"
+)
+WHITESPACE = re.compile(r"\s+")
+
+
+class RequestStats:
+    __slots__ = (
+        "started",
+        "query_count",
+        "db_time",
+        "render_time",
+        "render_started",
+        "statements",
+        "shapes",
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        self.statements = []
+        self.shapes = Counter()
+
+    def record(self, statement, duration, keep):
+        self.query_count += 1
+        self.db_time += duration
+        self.shapes[statement_shape(statement)] += 1
+        self.statements.append((duration, statement))
+        if len(self.statements) > keep * 4:
+            self.statements.sort(reverse=True)
+            del self.statements[keep:]
+
+    def slowest(self, count):
+        return sorted(self.statements, reverse=True)[:count]
+
+
+def statement_shape(statement):
+    return PARAMETER_LIST.sub("(?)", WHITESPACE.sub(" ", statement)).strip()
+
+
+def current_stats():
+    if has_app_context():
+        return g.get("request_stats")
+    return None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started, keep=10)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def _before_render(app, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.render_started is None:
+        stats.render_started = time.perf_counter()
+
+
+def _after_render(app, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.render_started is not None:
+        stats.render_time += time.perf_counter() - stats.render_started
+        stats.render_started = None
+
+
+def init_app(app):
+    if not app.config.get("SQL_INSTRUMENTATION", True):
+        return
+
+    threshold = app.config.get("SQL_REPEAT_THRESHOLD", 10)
+    slow_count = app.config.get("SQL_SLOW_STATEMENTS", 3)
+
+    if signals_available:
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def report_request_stats(response):
+        stats = g.pop("request_stats", None)
+        if stats is None:
+            return response
+
+        total = time.perf_counter() - stats.started
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={stats.db_time * 1000:.2f};desc="{stats.query_count} queries", '
+            f"render;dur={stats.render_time * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}",
+        )
+
+        app.logger.info(
+            json.dumps(
+                {
+                    "event": "request",
+                    "method": request.method,
+                    "path": request.path,
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "queries": stats.query_count,
+                    "db_ms": round(stats.db_time * 1000, 2),
+                    "render_ms": round(stats.render_time * 1000, 2),
+                    "total_ms": round(total * 1000, 2),
+                    "slowest": [
+                        {
+                            "ms": round(duration * 1000, 2),
+                            "sql": statement_shape(statement)[:200],
+                        }
+                        for duration, statement in stats.slowest(slow_count)
+                    ],
+                }
+            )
+        )
+
+        for shape, count in stats.shapes.items():
+            if count > threshold:
+                app.logger.warning(
+                    "Possible N+1 query on %s: statement ran %d times: %s",
+                    request.endpoint,
+                    count,
+                    shape[:300],
+                )
+
+        return response
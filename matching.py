@@ -0,0 +1,295 @@
+import itertools
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from app import db
+from models import Artist, Venue, genre_artist_table, genre_venue_table
+import queries
+
+# Artist-venue matchmaking. Each side is held as column arrays: genres as
+# rows of 64-bit words with one bit per genre code, city and state as integer
+# codes, the seeking flag and past show counts. Scoring a venue against
+# every artist (or the reverse) is then a single NumPy pass, and the top k
+# come from argpartition rather than a full sort. The arrays are built on
+# first use and updated per row by changes.py, which also drops the cached
+# results whenever a venue, artist or show changes. Results are kept for the
+# ``max_results`` most recently requested subjects.
+
+SIDES = {
+    Venue: (genre_venue_table, "venue", Venue.looking_for_talent),
+    Artist: (genre_artist_table, "artist", Artist.looking_for_venue),
+}
+COUNTERPARTS = {Venue: Artist, Artist: Venue}
+SHOW_COLUMNS = {Venue: "venue_id", Artist: "artist_id"}
+
+GENRE_WEIGHT = 0.5
+LOCATION_WEIGHT = 0.25
+HISTORY_WEIGHT = 0.15
+SEEKING_WEIGHT = 0.1
+# Shows already played together that count as a full history score.
+SHARED_SHOWS = 3
+
+
+class _Side:
+    def __init__(self, words=1):
+        self.positions = {}
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.genres = np.zeros((0, words), dtype=np.uint64)
+        self.genre_counts = np.zeros(0, dtype=np.int32)
+        self.states = np.zeros(0, dtype=np.int32)
+        self.cities = np.zeros(0, dtype=np.int32)
+        self.seeking = np.zeros(0, dtype=bool)
+        self.experience = np.zeros(0, dtype=np.float64)
+        self.valid = np.zeros(0, dtype=bool)
+
+    def set(self, rows):
+        """Insert or overwrite rows of ``(id, state, city, seeking, past, words)``."""
+        new = [row for row in rows if row[0] not in self.positions]
+        if new:
+            start = len(self.ids)
+            self.positions.update((row[0], start + i) for i, row in enumerate(new))
+            count = len(new)
+            self.ids = np.concatenate([self.ids, [row[0] for row in new]])
+            self.genres = np.concatenate(
+                [self.genres, np.zeros((count, self.genres.shape[1]), np.uint64)]
+            )
+            for name in ("genre_counts", "states", "cities", "experience", "valid"):
+                array = getattr(self, name)
+                setattr(
+                    self, name, np.concatenate([array, np.zeros(count, array.dtype)])
+                )
+            self.seeking = np.concatenate([self.seeking, np.zeros(count, bool)])
+
+        width = max((len(row[5]) for row in rows), default=0)
+        if width > self.genres.shape[1]:
+            self.genres = np.pad(
+                self.genres, ((0, 0), (0, width - self.genres.shape[1]))
+            )
+
+        for id, state, city, seeking, past, words in rows:
+            position = self.positions[id]
+            self.genres[position] = 0
+            self.genres[position, : len(words)] = words
+            self.genre_counts[position] = sum(int(word).bit_count() for word in words)
+            self.states[position] = state
+            self.cities[position] = city
+            self.seeking[position] = bool(seeking)
+            self.experience[position] = math.log1p(past or 0)
+            self.valid[position] = True
+
+    def remove(self, id):
+        position = self.positions.get(id)
+        if position is not None:
+            self.valid[position] = False
+
+    def score(self, words, state, city, shared):
+        """Return a score per row for a counterpart with the given attributes.
+
+        ``shared`` maps ids to the number of shows played with the
+        counterpart. Rows without a shared genre score ``-inf`` unless the
+        counterpart has no genres at all.
+        """
+        query = np.zeros(self.genres.shape[1], dtype=np.uint64)
+        width = min(len(words), len(query))
+        query[:width] = words[:width]
+        query_count = sum(int(word).bit_count() for word in words)
+
+        overlap = np.bitwise_count(self.genres & query).sum(axis=1, dtype=np.int32)
+        union = self.genre_counts + query_count - overlap
+        genre = np.divide(overlap, union, out=np.zeros(len(overlap)), where=union > 0)
+        location = np.where(
+            self.cities == city, 1.0, np.where(self.states == state, 0.5, 0.0)
+        )
+
+        history = self.experience.copy()
+        top = history[self.valid].max(initial=0.0)
+        if top > 0:
+            history /= top
+        together = np.zeros(len(self.ids))
+        positions = [self.positions[id] for id in shared if id in self.positions]
+        if positions:
+            together[positions] = [
+                min(shared[self.ids[position]], SHARED_SHOWS) / SHARED_SHOWS
+                for position in positions
+            ]
+        history = (history + together) / 2
+
+        scores = (
+            GENRE_WEIGHT * genre
+            + LOCATION_WEIGHT * location
+            + HISTORY_WEIGHT * history
+            + SEEKING_WEIGHT * self.seeking
+        )
+        scores[~self.valid] = -np.inf
+        if query_count:
+            scores[overlap == 0] = -np.inf
+        return scores
+
+    def top(self, scores, limit):
+        """Return ``[(id, score)]`` for the ``limit`` best finite scores."""
+        limit = min(limit, len(scores))
+        if not limit:
+            return []
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.lexsort((self.ids[best], -scores[best]))]
+        return [
+            (int(self.ids[position]), float(scores[position]))
+            for position in best
+            if np.isfinite(scores[position])
+        ]
+
+
+class MatchIndex:
+    def __init__(self, max_results=1024):
+        self.max_results = max_results
+        self._sides = {}
+        self._codes = {}
+        self._next_code = itertools.count(1)
+        self._genre_codes = {}
+        self._next_genre_code = itertools.count()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._code_lock = threading.Lock()
+
+    def matches(self, model, id, limit):
+        """Return the best ``limit`` counterparts for one venue or artist.
+
+        Each match is a dict of the counterpart's display columns plus its
+        ``score``; ``None`` means ``id`` does not exist.
+        """
+        key = (model, id, limit)
+        with self._lock:
+            # Writes replace the dict, so results computed across one are
+            # stored in the discarded copy rather than served stale.
+            results = self._results
+            if key in results:
+                results.move_to_end(key)
+                return results[key]
+
+        subject = self._rows(model, [id])
+        if not subject:
+            return None
+        _, state, city, _, _, words = subject[0]
+        # Unknown locations (code 0) never count as shared.
+        state, city = state or -1, city or -1
+
+        # Shared history includes archived shows.
+        counterpart = COUNTERPARTS[model]
+        shows = queries.all_shows()
+        column = shows.c[SHOW_COLUMNS[counterpart]]
+        shared = dict(
+            db.session.execute(
+                db.select(column, db.func.count())
+                .where(shows.c[SHOW_COLUMNS[model]] == id)
+                .group_by(column)
+            ).all()
+        )
+
+        with self._lock:
+            side = self._side(counterpart)
+            ranked = side.top(side.score(words, state, city, shared), limit)
+
+        rows = {
+            row.id: row
+            for row in db.session.execute(
+                db.select(
+                    counterpart.id,
+                    counterpart.name,
+                    counterpart.city,
+                    counterpart.state,
+                    counterpart.image_link,
+                ).where(counterpart.id.in_([id for id, _ in ranked]))
+            )
+        }
+        matches = [
+            {**rows[id]._asdict(), "score": round(score, 3)}
+            for id, score in ranked
+            if id in rows
+        ]
+
+        with self._lock:
+            results[key] = matches
+            if len(results) > self.max_results:
+                results.popitem(last=False)
+        return matches
+
+    def update(self, model, ids):
+        with self._lock:
+            self._results = OrderedDict()
+            side = self._sides.get(model)
+            if side is not None:
+                side.set(self._rows(model, ids))
+
+    def remove(self, model, id):
+        with self._lock:
+            self._results = OrderedDict()
+            side = self._sides.get(model)
+            if side is not None:
+                side.remove(id)
+
+    def forget_results(self):
+        with self._lock:
+            self._results = OrderedDict()
+
+    def reset(self):
+        with self._lock:
+            self._sides.clear()
+            self._results = OrderedDict()
+
+    def _side(self, model):
+        side = self._sides.get(model)
+        if side is None:
+            side = self._sides[model] = _Side()
+            side.set(self._rows(model))
+        return side
+
+    def _code(self, value):
+        return self._codes.setdefault(value, next(self._next_code))
+
+    def _genre_code(self, genre):
+        # Genre ids are sparse (merged duplicates, skipped sequence values),
+        # so bit positions come from a dense code per genre instead.
+        code = self._genre_codes.get(genre)
+        if code is None:
+            with self._code_lock:
+                code = self._genre_codes.get(genre)
+                if code is None:
+                    code = self._genre_codes[genre] = next(self._next_genre_code)
+        return code
+
+    def _rows(self, model, ids=None):
+        table, column, seeking_column = SIDES[model]
+        entity_column = table.c[column]
+        rows = db.select(
+            model.id, model.state, model.city, seeking_column, model.past_shows_count
+        )
+        genre_rows = db.select(entity_column, table.c.genre)
+        if ids is not None:
+            ids = list(ids)
+            rows = rows.where(model.id.in_(ids))
+            genre_rows = genre_rows.where(entity_column.in_(ids))
+
+        genres = {}
+        for id, genre in db.session.execute(genre_rows):
+            words = genres.setdefault(id, [])
+            word, bit = divmod(self._genre_code(genre), 64)
+            words.extend([0] * (word + 1 - len(words)))
+            words[word] |= 1 << bit
+
+        return [
+            (
+                id,
+                self._code(state) if state else 0,
+                self._code((state, city)) if city else 0,
+                seeking,
+                past,
+                genres.get(id, []),
+            )
+            for id, state, city, seeking, past in db.session.execute(rows)
+        ]
+
+
+index = MatchIndex()
@@ -0,0 +1,316 @@
+import atexit
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Response, current_app, g, request
+from sqlalchemy.pool import QueuePool
+
+# Minimal Prometheus-style metrics. Each thread writes to its own shard, so
+# recording a sample never takes a lock; shards are only summed when
+# /metrics is scraped, and a thread's shard is folded into a base total
+# when the thread exits. With METRICS_DIR set, every worker process also
+# dumps its totals to METRICS_DIR/<pid>.json every METRICS_FLUSH_INTERVAL
+# seconds and a scrape served by any worker merges all of them. A worker
+# removes its file when it exits, and a scrape drops the files of workers
+# that died without doing so; their counts leave the totals, which
+# Prometheus reads as a counter reset.
+#
+# /metrics and the other operational endpoints (ops_only) are disabled
+# unless OPS_TOKEN is set, and then require it as a bearer token.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "fyyur_http_requests_total": ("counter", "HTTP responses by endpoint and status."),
+    "fyyur_http_request_duration_seconds": (
+        "histogram",
+        "Request latency by endpoint.",
+    ),
+    "fyyur_template_render_seconds": ("histogram", "Template render time by endpoint."),
+    "fyyur_db_queries_total": ("counter", "SQL statements executed by endpoint."),
+    "fyyur_db_pool_checkout_wait_seconds": (
+        "histogram",
+        "Time spent waiting for a pooled connection.",
+    ),
+    "fyyur_db_pool_connections_in_use": ("gauge", "Checked out pool connections."),
+    "fyyur_db_pool_size": ("gauge", "Configured pool size."),
+    "fyyur_cache_hits_total": ("counter", "Page cache hits."),
+    "fyyur_cache_misses_total": ("counter", "Page cache misses."),
+}
+
+
+class _Owner:
+    """Per-thread sentinel; collected with its thread's local storage."""
+
+
+class Registry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        # Reentrant in case a finalizer runs while this thread holds it.
+        self._lock = threading.RLock()
+
+    def inc(self, name, labels=(), amount=1):
+        values = self._values()
+        key = (name, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        values = self._values()
+        key = (name, labels)
+        histogram = values.get(key)
+        if histogram is None:
+            histogram = values[key] = [0] * (len(buckets) + 1) + [0.0]
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        """Return ``{(name, labels): value}`` summed over every thread."""
+        with self._lock:
+            shards = list(self._shards)
+            totals = {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in self._base.items()
+            }
+        for shard in shards:
+            for key, value in dict(shard).items():
+                if isinstance(value, list):
+                    current = totals.setdefault(key, [0] * len(value))
+                    for index, item in enumerate(list(value)):
+                        current[index] += item
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def _values(self):
+        values = getattr(self._local, "values", None)
+        if values is None:
+            values = self._local.values = {}
+            self._local.owner = owner = _Owner()
+            weakref.finalize(owner, self._retire, values)
+            with self._lock:
+                self._shards.append(values)
+        return values
+
+    def _retire(self, values):
+        # The thread is gone, so nothing writes to ``values`` any more.
+        with self._lock:
+            self._shards = [shard for shard in self._shards if shard is not values]
+            _merge(self._base, values)
+
+
+registry = Registry()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            registry.observe(
+                "fyyur_db_pool_checkout_wait_seconds", time.perf_counter() - started
+            )
+
+
+def render(samples, gauges):
+    lines = []
+    by_name = {}
+    for (name, labels), value in samples.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for name, value in gauges:
+        by_name.setdefault(name[0], []).append((name[1], value))
+
+    for name in sorted(by_name):
+        kind, help = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), value[:-1]):
+                    cumulative += count
+                    bucket_labels = labels + (("le", str(bound)),)
+                    lines.append(f"{name}_bucket{_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {value[-1]}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _merge(totals, other):
+    for key, value in other.items():
+        if isinstance(value, list):
+            current = totals.setdefault(key, [0] * len(value))
+            for index, item in enumerate(value):
+                current[index] += item
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def ops_only(view):
+    """Serve ``view`` only to requests carrying ``Bearer <OPS_TOKEN>``."""
+
+    @wraps(view)
+    def wrapper(**view_args):
+        token = current_app.config.get("OPS_TOKEN")
+        if not token:
+            return Response(status=404)
+        given = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(given.encode(), f"Bearer {token}".encode()):
+            return Response(status=401, headers={"WWW-Authenticate": "Bearer"})
+        return view(**view_args)
+
+    return wrapper
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def init_app(app, db, cache):
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+        options.setdefault("poolclass", TimedQueuePool)
+
+    directory = app.config.get("METRICS_DIR")
+    interval = app.config.get("METRICS_FLUSH_INTERVAL", 5)
+    state = {"flushed": 0.0}
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(_remove, os.path.join(directory, f"{os.getpid()}.json"))
+
+    def process_samples():
+        samples = registry.snapshot()
+        samples[("fyyur_cache_hits_total", ())] = cache.hits
+        samples[("fyyur_cache_misses_total", ())] = cache.misses
+        return samples
+
+    def flush():
+        state["flushed"] = time.monotonic()
+        data = [
+            [name, list(labels), value]
+            for (name, labels), value in process_samples().items()
+        ]
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, os.path.join(directory, f"{os.getpid()}.json"))
+
+    def pool_gauges():
+        gauges = []
+        engines = [("default", db.engine)]
+        engines += [
+            (bind, db.get_engine(bind=bind))
+            for bind in app.config.get("SQLALCHEMY_BINDS") or {}
+        ]
+        for bind, engine in engines:
+            pool = engine.pool
+            if hasattr(pool, "checkedout"):
+                labels = (("bind", bind), ("pid", os.getpid()))
+                gauges.append(
+                    (("fyyur_db_pool_connections_in_use", labels), pool.checkedout())
+                )
+                gauges.append((("fyyur_db_pool_size", labels), pool.size()))
+        return gauges
+
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+
+        endpoint = request.endpoint or "unknown"
+        labels = (("endpoint", endpoint),)
+        registry.observe(
+            "fyyur_http_request_duration_seconds", time.perf_counter() - started, labels
+        )
+        registry.inc(
+            "fyyur_http_requests_total",
+            labels + (("method", request.method), ("status", response.status_code)),
+        )
+
+        stats = g.get("request_stats")
+        if stats is not None:
+            registry.inc("fyyur_db_queries_total", labels, stats.query_count)
+            if stats.render_time:
+                registry.observe(
+                    "fyyur_template_render_seconds", stats.render_time, labels
+                )
+
+        if directory and time.monotonic() - state["flushed"] > interval:
+            flush()
+        return response
+
+    @app.route("/metrics")
+    @ops_only
+    def metrics():
+        samples = process_samples()
+        if directory:
+            flush()
+            samples = {}
+            for name in os.listdir(directory):
+                pid, extension = os.path.splitext(name)
+                if extension != ".json":
+                    continue
+                path = os.path.join(directory, name)
+                if pid.isdigit() and not _alive(int(pid)):
+                    _remove(path)
+                    continue
+                try:
+                    with open(path) as file:
+                        data = json.load(file)
+                except (OSError, ValueError):
+                    continue
+                _merge(
+                    samples,
+                    {
+                        (metric, tuple(map(tuple, labels))): value
+                        for metric, labels, value in data
+                    },
+                )
+        return Response(
+            render(samples, pool_gauges()), mimetype="text/plain; version=0.0.4"
+        )
@@ -0,0 +1,43 @@
+"""unique genre names
+
+Revision ID: 3f1c9a7d2b64
+Revises: e08449c6ab15
+Create Date: 2026-10-18 09:12:41.513207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b64'
+down_revision = 'e08449c6ab15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fold duplicate genres into the lowest id before adding the constraint.
+    op.execute(
+        'CREATE TEMPORARY TABLE genre_duplicates AS '
+        'SELECT id, min(id) OVER (PARTITION BY name) AS keep_id FROM "Genre"'
+    )
+    op.execute('DELETE FROM genre_duplicates WHERE id = keep_id')
+    for table, column in (('genre_venue_table', 'venue'), ('genre_artist_table', 'artist')):
+        op.execute(
+            f'INSERT INTO {table} (genre, {column}) '
+            f'SELECT DISTINCT d.keep_id, t.{column} FROM {table} t '
+            f'JOIN genre_duplicates d ON d.id = t.genre '
+            f'ON CONFLICT DO NOTHING'
+        )
+        op.execute(
+            f'DELETE FROM {table} t USING genre_duplicates d WHERE t.genre = d.id'
+        )
+    op.execute('DELETE FROM "Genre" g USING genre_duplicates d WHERE g.id = d.id')
+    op.execute('DROP TABLE genre_duplicates')
+
+    op.create_unique_constraint('Genre_name_key', 'Genre', ['name'])
+
+
+def downgrade():
+    op.drop_constraint('Genre_name_key', 'Genre', type_='unique')
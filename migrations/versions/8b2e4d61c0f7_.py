@@ -0,0 +1,56 @@
+"""secondary indexes for show, venue, artist and genre lookups
+
+Revision ID: 8b2e4d61c0f7
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-18 10:03:17.208345
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d61c0f7'
+down_revision = '3f1c9a7d2b64'
+branch_labels = None
+depends_on = None
+
+# CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction, so every
+# statement below runs in an autocommit block and does not lock out writes.
+# If a concurrent build fails it leaves an INVALID index behind; drop it and
+# re-run the upgrade.
+INDEXES = [
+    ('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], {}),
+    ('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], {}),
+    ('ix_Show_start_time_id', 'Show', ['start_time', 'id'], {}),
+    ('ix_Venue_state_city', 'Venue', ['state', 'city'], {}),
+    (
+        'ix_Venue_name_trgm',
+        'Venue',
+        ['name'],
+        {'postgresql_using': 'gin', 'postgresql_ops': {'name': 'gin_trgm_ops'}},
+    ),
+    (
+        'ix_Artist_name_trgm',
+        'Artist',
+        ['name'],
+        {'postgresql_using': 'gin', 'postgresql_ops': {'name': 'gin_trgm_ops'}},
+    ),
+    ('ix_genre_venue_table_venue', 'genre_venue_table', ['venue'], {}),
+    ('ix_genre_artist_table_artist', 'genre_artist_table', ['artist'], {}),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table, columns, options in INDEXES:
+            op.create_index(
+                name, table, columns, postgresql_concurrently=True, **options
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,69 @@
+"""search_text documents with full-text and trigram indexes
+
+Revision ID: a6f3e1d9c852
+Revises: 5d90b3e2a8f4
+Create Date: 2026-10-18 14:12:40.518223
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6f3e1d9c852'
+down_revision = '5d90b3e2a8f4'
+branch_labels = None
+depends_on = None
+
+TABLES = (
+    ('Venue', 'genre_venue_table', 'venue'),
+    ('Artist', 'genre_artist_table', 'artist'),
+)
+
+
+def upgrade():
+    for table, genre_table, column in TABLES:
+        op.add_column(table, sa.Column('search_text', sa.Text(), server_default='', nullable=False))
+        op.execute(
+            f'UPDATE "{table}" SET search_text = lower('
+            f"coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || "
+            f"coalesce(state, '') || ' ' || coalesce((SELECT string_agg(g.name, ' ') "
+            f'FROM {genre_table} t JOIN "Genre" g ON g.id = t.genre '
+            f'WHERE t.{column} = "{table}".id), \'\'))'
+        )
+
+    # Index builds run concurrently, outside the migration transaction, so
+    # searches and writes keep working while they build.
+    with op.get_context().autocommit_block():
+        for table, _, _ in TABLES:
+            op.create_index(
+                f'ix_{table}_search_text_trgm',
+                table,
+                ['search_text'],
+                postgresql_using='gin',
+                postgresql_ops={'search_text': 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+            )
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY "ix_{table}_search_text_tsv" ON "{table}" '
+                "USING gin (to_tsvector('simple'::regconfig, search_text))"
+            )
+            op.drop_index(f'ix_{table}_name_trgm', table_name=table, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table, _, _ in reversed(TABLES):
+            op.create_index(
+                f'ix_{table}_name_trgm',
+                table,
+                ['name'],
+                postgresql_using='gin',
+                postgresql_ops={'name': 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+            )
+            op.execute(f'DROP INDEX CONCURRENTLY "ix_{table}_search_text_tsv"')
+            op.drop_index(f'ix_{table}_search_text_trgm', table_name=table, postgresql_concurrently=True)
+
+    for table, _, _ in reversed(TABLES):
+        op.drop_column(table, 'search_text')
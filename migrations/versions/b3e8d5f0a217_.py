@@ -0,0 +1,24 @@
+"""index ShowArchive by (start_time, id) for the all-shows listings
+
+Revision ID: b3e8d5f0a217
+Revises: f9d3a2b71c45
+Create Date: 2026-10-18 21:05:37.126840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d5f0a217'
+down_revision = 'f9d3a2b71c45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_ShowArchive_start_time_id', 'ShowArchive', ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ShowArchive_start_time_id', table_name='ShowArchive')
@@ -0,0 +1,39 @@
+"""show counters on venue and artist
+
+Revision ID: c47a0e93d5b1
+Revises: 8b2e4d61c0f7
+Create Date: 2026-10-18 11:26:05.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a0e93d5b1'
+down_revision = '8b2e4d61c0f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table, column in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_time', sa.DateTime(), nullable=True))
+        op.execute(
+            f'UPDATE "{table}" SET '
+            f'upcoming_shows_count = (SELECT count(*) FROM "Show" s '
+            f'WHERE s.{column} = "{table}".id AND s.start_time > localtimestamp), '
+            f'past_shows_count = (SELECT count(*) FROM "Show" s '
+            f'WHERE s.{column} = "{table}".id AND s.start_time <= localtimestamp), '
+            f'next_show_time = (SELECT min(s.start_time) FROM "Show" s '
+            f'WHERE s.{column} = "{table}".id AND s.start_time > localtimestamp)'
+        )
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'next_show_time')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
@@ -0,0 +1,36 @@
+"""daily show rollups for venue and artist calendars
+
+Revision ID: f2b7c4a19e03
+Revises: a6f3e1d9c852
+Create Date: 2026-10-18 16:02:11.904317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7c4a19e03'
+down_revision = 'a6f3e1d9c852'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowDailyCount',
+    sa.Column('kind', sa.String(length=6), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('show_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'owner_id', 'day')
+    )
+    for kind, column in (('venue', 'venue_id'), ('artist', 'artist_id')):
+        op.execute(
+            'INSERT INTO "ShowDailyCount" (kind, owner_id, day, show_count) '
+            f"SELECT '{kind}', {column}, date(start_time), count(*) "
+            f'FROM "Show" GROUP BY {column}, date(start_time)'
+        )
+
+
+def downgrade():
+    op.drop_table('ShowDailyCount')
@@ -0,0 +1,117 @@
+"""partition Show by month and add ShowArchive
+
+Revision ID: f9d3a2b71c45
+Revises: f2b7c4a19e03
+Create Date: 2026-10-18 17:20:48.311952
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f9d3a2b71c45'
+down_revision = 'f2b7c4a19e03'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_{}_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_{}_artist_id_start_time', ['artist_id', 'start_time']),
+)
+
+COLUMNS = 'id, start_time, artist_id, venue_id'
+
+# Creates one partition per month from the oldest show up to twelve months
+# ahead; later months go to the DEFAULT partition until
+# "flask shows partition" creates them.
+MONTHLY_PARTITIONS = '''
+DO $$
+DECLARE
+    month date := date_trunc('month', coalesce(
+        (SELECT min(start_time) FROM "Show_unpartitioned"), localtimestamp));
+    last date := date_trunc('month', localtimestamp) + interval '12 months';
+BEGIN
+    WHILE month <= last LOOP
+        EXECUTE 'CREATE TABLE ' || quote_ident('Show_p' || to_char(month, 'YYYY_MM'))
+            || ' PARTITION OF "Show" FOR VALUES FROM (' || quote_literal(month)
+            || ') TO (' || quote_literal(month + interval '1 month') || ')';
+        month := month + interval '1 month';
+    END LOOP;
+END $$
+'''
+
+
+def partitioned_table(name, id_default):
+    op.execute(
+        f'CREATE TABLE "{name}" ('
+        f'id integer NOT NULL{id_default}, '
+        'start_time timestamp without time zone NOT NULL, '
+        'artist_id integer NOT NULL REFERENCES "Artist" (id), '
+        'venue_id integer NOT NULL REFERENCES "Venue" (id), '
+        'PRIMARY KEY (id, start_time)'
+        ') PARTITION BY RANGE (start_time)'
+    )
+    op.execute(f'CREATE TABLE "{name}_default" PARTITION OF "{name}" DEFAULT')
+
+
+def upgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        op.create_table('ShowArchive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        for name, columns in INDEXES:
+            op.create_index(name.format('ShowArchive'), 'ShowArchive', columns)
+        return
+
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_unpartitioned"')
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_unpartitioned_pkey"')
+    for name, _ in INDEXES:
+        op.drop_index(name.format('Show'), table_name='Show_unpartitioned')
+    op.drop_index('ix_Show_start_time_id', table_name='Show_unpartitioned')
+
+    partitioned_table('Show', ' DEFAULT nextval(\'"Show_id_seq"\'::regclass)')
+    op.execute(MONTHLY_PARTITIONS)
+    op.execute(f'INSERT INTO "Show" ({COLUMNS}) SELECT {COLUMNS} FROM "Show_unpartitioned"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.drop_table('Show_unpartitioned')
+
+    partitioned_table('ShowArchive', '')
+    for table in ('Show', 'ShowArchive'):
+        for name, columns in INDEXES:
+            op.create_index(name.format(table), table, columns)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'])
+
+
+def downgrade():
+    if op.get_context().dialect.name != 'postgresql':
+        for name, _ in INDEXES:
+            op.drop_index(name.format('ShowArchive'), table_name='ShowArchive')
+        op.drop_table('ShowArchive')
+        return
+
+    op.execute(
+        'CREATE TABLE "Show_unpartitioned" ('
+        'id integer NOT NULL DEFAULT nextval(\'"Show_id_seq"\'::regclass), '
+        'start_time timestamp without time zone NOT NULL, '
+        'artist_id integer NOT NULL REFERENCES "Artist" (id), '
+        'venue_id integer NOT NULL REFERENCES "Venue" (id), '
+        'CONSTRAINT "Show_unpartitioned_pkey" PRIMARY KEY (id))'
+    )
+    for table in ('ShowArchive', 'Show'):
+        op.execute(f'INSERT INTO "Show_unpartitioned" ({COLUMNS}) SELECT {COLUMNS} FROM "{table}"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show_unpartitioned".id')
+    op.drop_table('ShowArchive')
+    op.drop_table('Show')
+
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME TO "Show"')
+    op.execute('ALTER TABLE "Show" RENAME CONSTRAINT "Show_unpartitioned_pkey" TO "Show_pkey"')
+    for name, columns in INDEXES:
+        op.create_index(name.format('Show'), 'Show', columns)
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'])
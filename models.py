@@ -1,16 +1,19 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import DDL, event
 
 genre_artist_table = db.Table(
     "genre_artist_table",
     db.Column("genre", db.Integer, db.ForeignKey("Genre.id"), primary_key=True),
     db.Column("artist", db.Integer, db.ForeignKey("Artist.id"), primary_key=True),
+    db.Index("ix_genre_artist_table_artist", "artist"),
 )
 
 genre_venue_table = db.Table(
     "genre_venue_table",
     db.Column("genre", db.Integer, db.ForeignKey("Genre.id"), primary_key=True),
     db.Column("venue", db.Integer, db.ForeignKey("Venue.id"), primary_key=True),
+    db.Index("ix_genre_venue_table_venue", "venue"),
 )
 
 
@@ -18,14 +21,22 @@ class Genre(db.Model):
     __tablename__ = "Genre"
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
+    name = db.Column(db.String, unique=True)
 
     def __repr__(self):
         return f"<Genre id: {self.id} name: {self.name}>"
 
 
+# On Postgres, Show and ShowArchive are partitioned by month of start_time
+# (see the f9d3a2b71c45 migration and archive.py), with (id, start_time)
+# as their primary key; the ORM keeps addressing shows by id alone.
 class Show(db.Model):
     __tablename__ = "Show"
+    __table_args__ = (
+        db.Index("ix_Show_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_Show_artist_id_start_time", "artist_id", "start_time"),
+        db.Index("ix_Show_start_time_id", "start_time", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -45,8 +56,36 @@ class Show(db.Model):
         return f"<Show id: {self.id} artist_id: {self.artist_id} venue_id: {self.venue_id}>"
 
 
+class ShowArchive(db.Model):
+    """Past shows moved out of Show by ``flask shows archive``."""
+
+    __tablename__ = "ShowArchive"
+    __table_args__ = (
+        db.Index("ix_ShowArchive_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_ShowArchive_artist_id_start_time", "artist_id", "start_time"),
+        db.Index("ix_ShowArchive_start_time_id", "start_time", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"), nullable=False)
+
+    def __repr__(self):
+        return f"<ShowArchive id: {self.id} artist_id: {self.artist_id} venue_id: {self.venue_id}>"
+
+
 class Venue(db.Model):
     __tablename__ = "Venue"
+    __table_args__ = (
+        db.Index("ix_Venue_state_city", "state", "city"),
+        db.Index(
+            "ix_Venue_search_text_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -59,6 +98,15 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     looking_for_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    next_show_time = db.Column(db.DateTime)
+    # Lowercase name, city, state and genre names, maintained by search.py.
+    search_text = db.Column(db.Text, nullable=False, default="", server_default="")
 
     genres = db.relationship(
         "Genre", secondary=genre_venue_table, backref=db.backref("venues")
@@ -71,6 +119,14 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = "Artist"
+    __table_args__ = (
+        db.Index(
+            "ix_Artist_search_text_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -82,6 +138,15 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     looking_for_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120))
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    next_show_time = db.Column(db.DateTime)
+    # Lowercase name, city, state and genre names, maintained by search.py.
+    search_text = db.Column(db.Text, nullable=False, default="", server_default="")
 
     genres = db.relationship(
         "Genre", secondary=genre_artist_table, backref=db.backref("artist")
@@ -92,3 +157,56 @@ class Artist(db.Model):
 
     def __repr__(self):
         return f"<Artist id: {self.id} name: {self.name}>"
+
+
+# The full-text index is an expression index, which only Postgres builds.
+for _table in ("Venue", "Artist"):
+    event.listen(
+        db.Model.metadata.tables[_table],
+        "after_create",
+        DDL(
+            f'CREATE INDEX "ix_{_table}_search_text_tsv" ON "{_table}" '
+            "USING gin (to_tsvector('simple'::regconfig, search_text))"
+        ).execute_if(dialect="postgresql"),
+    )
+
+
+class ShowDailyCount(db.Model):
+    """Shows per venue or artist per day, maintained by show_counters.py."""
+
+    __tablename__ = "ShowDailyCount"
+
+    # "venue" or "artist"
+    kind = db.Column(db.String(6), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ShowDailyCount {self.kind} {self.owner_id} {self.day}: {self.show_count}>"
+
+
+class DataVersion(db.Model):
+    """Single-row global write counter used to build HTTP validators."""
+
+    __tablename__ = "DataVersion"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DataVersion version: {self.version} updated_at: {self.updated_at}>"
+
+
+class PageVersion(db.Model):
+    """Write counter per cached page, e.g. ``venues`` or ``show_venue:3``."""
+
+    __tablename__ = "PageVersion"
+
+    key = db.Column(db.String(120), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PageVersion {self.key} version: {self.version}>"
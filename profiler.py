@@ -0,0 +1,222 @@
+import atexit
+import cProfile
+import hashlib
+import hmac
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import ClosingIterator
+
+# Opt-in request profiler. ProfilerMiddleware wraps app.wsgi_app and is only
+# installed when PROFILE_SAMPLE_RATE or PROFILE_SECRET is set, so an
+# unprofiled deployment runs the plain WSGI app. A request is profiled when
+# it wins the PROFILE_SAMPLE_RATE draw or carries a valid X-Profile header
+# (see sign()). Profiles are aggregated per endpoint and written to
+# PROFILE_DIR as <endpoint>.<pid>.pstats (cProfile mode) or
+# <endpoint>.<pid>.collapsed (stack sampling mode, flamegraph.pl input):
+# sampled profiles every PROFILE_FLUSH_EVERY requests and at exit, and
+# header-triggered ones as soon as the request ends.
+
+HEADER = "HTTP_X_PROFILE"
+
+
+def sign(secret, path, ttl=300):
+    """Return an ``X-Profile`` header value for ``path`` valid for ``ttl`` s."""
+    expires = int(time.time()) + ttl
+    return f"{expires}:{_signature(secret, expires, path)}"
+
+
+def _signature(secret, expires, path):
+    message = f"{expires}:{path}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class StackSampler:
+    """Samples the stacks of registered threads from one background thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, counter):
+        with self._lock:
+            self._threads[threading.get_ident()] = counter
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="profile-sampler", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                threads = list(self._threads.items())
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for ident, counter in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    counter[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class ProfilerMiddleware:
+    def __init__(
+        self,
+        wsgi_app,
+        url_map,
+        directory,
+        sample_rate=0.0,
+        secret=None,
+        mode="cprofile",
+        interval=0.005,
+        flush_every=10,
+    ):
+        self.wsgi_app = wsgi_app
+        self.url_map = url_map
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.secret = secret
+        self.mode = mode
+        self.flush_every = flush_every
+        self.sampler = StackSampler(interval) if mode == "sample" else None
+        self._profiles = {}
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        # Only one cProfile profiler can be active at a time, so concurrent
+        # requests that lose the race simply run unprofiled.
+        self._cprofile_busy = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.flush)
+
+    def __call__(self, environ, start_response):
+        requested = self._requested(environ)
+        if not requested and not self._sampled_now():
+            return self.wsgi_app(environ, start_response)
+
+        endpoint = self._endpoint(environ)
+        if self.mode == "sample":
+            counter = Counter()
+            self.sampler.start(counter)
+            stop = lambda: self._sampled(endpoint, counter, requested)
+        else:
+            if not self._cprofile_busy.acquire(blocking=False):
+                return self.wsgi_app(environ, start_response)
+            profile = cProfile.Profile()
+            profile.enable()
+            stop = lambda: self._profiled(endpoint, profile, requested)
+
+        try:
+            body = self.wsgi_app(environ, start_response)
+        except BaseException:
+            stop()
+            raise
+        # Streamed bodies are produced while the server iterates, so the
+        # profile only ends when the response is closed.
+        return ClosingIterator(body, stop)
+
+    def _requested(self, environ):
+        """Whether the request carries a valid X-Profile header."""
+        header = environ.get(HEADER)
+        if header and self.secret:
+            expires, _, signature = header.partition(":")
+            if expires.isdigit() and int(expires) >= time.time():
+                expected = _signature(self.secret, expires, environ["PATH_INFO"])
+                return hmac.compare_digest(signature, expected)
+        return False
+
+    def _sampled_now(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _endpoint(self, environ):
+        try:
+            endpoint, _ = self.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return "unmatched"
+        return endpoint
+
+    def _profiled(self, endpoint, profile, requested):
+        profile.disable()
+        self._cprofile_busy.release()
+        with self._lock:
+            stats = self._profiles.get(endpoint)
+            if stats is None:
+                self._profiles[endpoint] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            self._maybe_flush(endpoint, requested)
+
+    def _sampled(self, endpoint, counter, requested):
+        self.sampler.stop()
+        with self._lock:
+            self._profiles.setdefault(endpoint, Counter()).update(counter)
+            self._maybe_flush(endpoint, requested)
+
+    def _maybe_flush(self, endpoint, now=False):
+        self._pending[endpoint] += 1
+        if now or self._pending[endpoint] >= self.flush_every:
+            self._write(endpoint)
+
+    def flush(self):
+        """Write every endpoint with profiles not yet on disk."""
+        with self._lock:
+            for endpoint, pending in list(self._pending.items()):
+                if pending:
+                    self._write(endpoint)
+
+    def _write(self, endpoint):
+        self._pending[endpoint] = 0
+        profile = self._profiles[endpoint]
+        name = os.path.join(self.directory, f"{endpoint}.{os.getpid()}")
+        if self.mode == "sample":
+            tmp_path = f"{name}.collapsed.tmp"
+            with open(tmp_path, "w") as file:
+                for stack, count in profile.most_common():
+                    file.write(f"{stack} {count}\n")
+            os.replace(tmp_path, f"{name}.collapsed")
+        else:
+            tmp_path = f"{name}.pstats.tmp"
+            profile.dump_stats(tmp_path)
+            os.replace(tmp_path, f"{name}.pstats")
+
+
+def init_app(app):
+    sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    secret = app.config.get("PROFILE_SECRET")
+    if not sample_rate and not secret:
+        return
+
+    app.wsgi_app = ProfilerMiddleware(
+        app.wsgi_app,
+        app.url_map,
+        app.config["PROFILE_DIR"],
+        sample_rate=sample_rate,
+        secret=secret,
+        mode=app.config.get("PROFILE_MODE", "cprofile"),
+        interval=app.config.get("PROFILE_INTERVAL", 0.005),
+        flush_every=app.config.get("PROFILE_FLUSH_EVERY", 10),
+    )
@@ -0,0 +1,285 @@
+from collections import namedtuple
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy.orm import joinedload
+
+from app import db
+from models import Artist, Show, ShowArchive, Venue
+
+# Immutable rows for list and search pages, built straight from column
+# projections so listings never hydrate ORM instances or per-row dicts.
+Summary = namedtuple("Summary", ["id", "name", "num_upcoming_shows"])
+Area = namedtuple("Area", ["city", "state", "venues"])
+
+
+def summaries(model):
+    """Return a Summary of every venue or artist, in id order."""
+    rows = db.session.execute(
+        db.select(model.id, model.name, model.upcoming_shows_count).order_by(model.id)
+    )
+    return list(map(Summary._make, rows))
+
+
+def venue_areas():
+    """Return venues grouped by (state, city) with their upcoming show counts.
+
+    Counts come from the denormalized ``upcoming_shows_count`` column, so one
+    ordered scan of Venue produces every row regardless of how many venues or
+    shows exist.
+    """
+    rows = db.session.execute(
+        db.select(
+            Venue.state,
+            Venue.city,
+            Venue.id,
+            Venue.name,
+            Venue.upcoming_shows_count,
+        ).order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+    )
+
+    return [
+        Area(city, state, [Summary(*row[2:]) for row in venues])
+        for (state, city), venues in groupby(rows, key=lambda row: row[:2])
+    ]
+
+
+SIDES = {
+    Venue: ("venue_id", Artist, "artist"),
+    Artist: ("artist_id", Venue, "venue"),
+}
+
+
+def show_rows(source, model, id):
+    """Select ``source`` (Show or ShowArchive) rows of one venue or artist.
+
+    Each row carries the other side's id, name and image link under
+    ``artist_*`` or ``venue_*`` keys, plus ``id`` and ``start_time``.
+    """
+    column, counterpart, kind = SIDES[model]
+    return (
+        db.select(
+            source.id,
+            source.start_time,
+            counterpart.id.label(f"{kind}_id"),
+            counterpart.name.label(f"{kind}_name"),
+            counterpart.image_link.label(f"{kind}_image_link"),
+        )
+        .join(counterpart, counterpart.id == getattr(source, SIDES[counterpart][0]))
+        .where(getattr(source, column) == id)
+    )
+
+
+def upcoming_shows(model, id, now, limit=None):
+    """Return the ``limit`` soonest upcoming shows, all of them without one.
+
+    Only reads the hot Show partitions.
+    """
+    statement = show_rows(Show, model, id).where(Show.start_time > now)
+    statement = statement.order_by(Show.start_time, Show.id).limit(limit)
+    return [dict(row._mapping) for row in db.session.execute(statement)]
+
+
+def show_counts(model, id, now):
+    """Return ``(upcoming, past)`` show counts, both split at ``now``.
+
+    Unlike the denormalized counters, these do not wait for roll_forward()
+    to move shows that have just started into the past.
+    """
+    column = SIDES[model][0]
+    shows = db.select(db.func.count(Show.id)).where(getattr(Show, column) == id)
+    archived = db.select(db.func.count(ShowArchive.id)).where(
+        getattr(ShowArchive, column) == id
+    )
+    return db.session.execute(
+        db.select(
+            shows.where(Show.start_time > now).scalar_subquery(),
+            shows.where(Show.start_time <= now).scalar_subquery()
+            + archived.scalar_subquery(),
+        )
+    ).one()
+
+
+def past_shows(model, id, now, before=None, archive=False, per_page=10):
+    """Return one page of past shows, newest first, and whether more follow.
+
+    ``before`` is a ``(start_time, id)`` cursor. ShowArchive is only read
+    when ``archive`` is set; its rows are all older than those in Show.
+    """
+    sources = [(Show, Show.start_time <= now)]
+    if archive:
+        sources.append((ShowArchive, None))
+
+    rows = []
+    for source, condition in sources:
+        statement = show_rows(source, model, id)
+        if condition is not None:
+            statement = statement.where(condition)
+        if before:
+            statement = statement.where(
+                db.tuple_(source.start_time, source.id) < before
+            )
+        statement = statement.order_by(
+            source.start_time.desc(), source.id.desc()
+        ).limit(per_page + 1)
+        rows.extend(dict(row._mapping) for row in db.session.execute(statement))
+        if len(rows) > per_page:
+            break
+
+    rows.sort(key=lambda row: (row["start_time"], row["id"]), reverse=True)
+    return rows[:per_page], len(rows) > per_page
+
+
+def has_archived_shows(model, id):
+    column = getattr(ShowArchive, SIDES[model][0])
+    return db.session.execute(db.select(db.exists().where(column == id))).scalar()
+
+
+def _detail_shows(model, id, now, past_before, archive, per_page, upcoming_limit):
+    past, more = past_shows(model, id, now, past_before, archive, per_page)
+    upcoming = upcoming_shows(model, id, now, upcoming_limit)
+    upcoming_count, past_count = show_counts(model, id, now)
+    # Only the last page of the hot shows links on into the archive.
+    archived = not (more or archive) and has_archived_shows(model, id)
+    return {
+        "past_shows": past,
+        "past_cursor": (
+            format_cursor(past[-1]["start_time"], past[-1]["id"]) if past else None
+        ),
+        "past_more": more,
+        "past_before": past_before,
+        "archive": archive,
+        "has_archive": archived,
+        "past_shows_count": past_count,
+        "upcoming_shows": upcoming,
+        "upcoming_shows_count": upcoming_count,
+    }
+
+
+def venue_detail(
+    venue_id, now, past_before=None, archive=False, per_page=10, upcoming_limit=None
+):
+    venue = Venue.query.options(joinedload(Venue.genres)).get(venue_id)
+
+    if not venue:
+        return None
+
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": [genre.name for genre in venue.genres],
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.looking_for_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        **_detail_shows(
+            Venue, venue_id, now, past_before, archive, per_page, upcoming_limit
+        ),
+    }
+
+
+def artist_detail(
+    artist_id, now, past_before=None, archive=False, per_page=10, upcoming_limit=None
+):
+    artist = Artist.query.options(joinedload(Artist.genres)).get(artist_id)
+
+    if not artist:
+        return None
+
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": [genre.name for genre in artist.genres],
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.looking_for_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        **_detail_shows(
+            Artist, artist_id, now, past_before, archive, per_page, upcoming_limit
+        ),
+    }
+
+
+def parse_cursor(value):
+    """Parse a ``/shows`` cursor of the form ``<start_time iso>,<show id>``."""
+    start_time, show_id = value.rsplit(",", 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+
+
+def format_cursor(start_time, show_id):
+    return f"{start_time.isoformat()},{show_id}"
+
+
+def all_shows():
+    """Return Show and ShowArchive as one ``all_shows`` subquery."""
+    columns = ("id", "start_time", "venue_id", "artist_id")
+    return db.union_all(
+        *(
+            db.select(*(getattr(source, column) for column in columns))
+            for source in (Show, ShowArchive)
+        )
+    ).subquery("all_shows")
+
+
+def show_source(when):
+    """Return the shows a ``when`` filter can match, as a table or subquery.
+
+    Upcoming shows are never archived, so only they skip ShowArchive.
+    """
+    return Show.__table__ if when == "upcoming" else all_shows()
+
+
+def show_page(now, after=None, when=None, start=None, end=None, per_page=30):
+    """Return one keyset page of shows ordered by ``(start_time, id)``.
+
+    Returns ``(shows, next_cursor)``; ``next_cursor`` is ``None`` on the last
+    page. ``when`` is ``"upcoming"``, ``"past"`` or ``None`` for all shows and
+    ``start``/``end`` bound ``start_time`` to ``[start, end)``. Past and
+    unfiltered pages include archived shows.
+    """
+    source = show_source(when)
+    statement = (
+        db.select(
+            source.c.id,
+            source.c.start_time,
+            source.c.venue_id,
+            Venue.name.label("venue_name"),
+            source.c.artist_id,
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .select_from(source)
+        .join(Venue, Venue.id == source.c.venue_id)
+        .join(Artist, Artist.id == source.c.artist_id)
+    )
+
+    if when == "upcoming":
+        statement = statement.where(source.c.start_time > now)
+    elif when == "past":
+        statement = statement.where(source.c.start_time <= now)
+    if start:
+        statement = statement.where(source.c.start_time >= start)
+    if end:
+        statement = statement.where(source.c.start_time < end)
+    if after:
+        statement = statement.where(db.tuple_(source.c.start_time, source.c.id) > after)
+
+    rows = db.session.execute(
+        statement.order_by(source.c.start_time, source.c.id).limit(per_page + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = format_cursor(rows[-1].start_time, rows[-1].id)
+
+    return [dict(row._mapping) for row in rows], next_cursor
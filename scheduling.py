@@ -0,0 +1,214 @@
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from app import db
+from models import Artist, Show, ShowArchive, Venue
+import show_counters
+
+# Show scheduling with double-booking checks. A show holds its venue and its
+# artist for SHOW_DURATION_MINUTES, so two shows conflict when they share
+# either and start less than that apart. A batch costs a fixed number of
+# queries: one IN query per model validates (and, on Postgres, locks) the
+# venues and artists, one query per model loads the shows, live or
+# archived, they already have around the batch's start times, and the
+# accepted rows are inserted together on the caller's transaction.
+
+
+class ScheduleResult:
+    __slots__ = ("venue_id", "artist_id", "start_time", "error")
+
+    def __init__(self, venue_id, artist_id, start_time, error=None):
+        self.venue_id = venue_id
+        self.artist_id = artist_id
+        self.start_time = start_time
+        self.error = error
+
+    @property
+    def scheduled(self):
+        return self.error is None
+
+    def to_dict(self, row):
+        result = {
+            "row": row,
+            "venue_id": self.venue_id,
+            "artist_id": self.artist_id,
+            "start_time": self.start_time.isoformat() if self.start_time else None,
+            "status": "scheduled" if self.scheduled else "rejected",
+        }
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+def parse(row):
+    """Return ``(venue_id, artist_id, start_time)`` from a JSON or CSV row.
+
+    Raises ``ValueError`` describing the first invalid field.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("expected an object")
+    values = []
+    for field in ("venue_id", "artist_id"):
+        try:
+            values.append(int(row[field]))
+        except KeyError:
+            raise ValueError(f"missing {field}")
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid {field} {row[field]!r}")
+    try:
+        values.append(datetime.fromisoformat(str(row["start_time"]).strip()))
+    except KeyError:
+        raise ValueError("missing start_time")
+    except ValueError:
+        raise ValueError(f"invalid start_time {row['start_time']!r}")
+    return tuple(values)
+
+
+def schedule_rows(rows, now):
+    """Parse and schedule ``(row number, row)`` pairs.
+
+    Returns the per-row report, ordered by row number, and the scheduled
+    ``(venue_id, artist_id, start_time)`` tuples.
+    """
+    report, numbers, shows = [], [], []
+    for number, row in rows:
+        try:
+            shows.append(parse(row))
+        except ValueError as error:
+            report.append({"row": number, "status": "rejected", "error": str(error)})
+        else:
+            numbers.append(number)
+
+    results = schedule(shows, now) if shows else []
+    report.extend(result.to_dict(number) for number, result in zip(numbers, results))
+    report.sort(key=lambda result: result["row"])
+    accepted = [
+        (result.venue_id, result.artist_id, result.start_time)
+        for result in results
+        if result.scheduled
+    ]
+    return report, accepted
+
+
+def schedule(shows, now):
+    """Insert every ``(venue_id, artist_id, start_time)`` that can be booked.
+
+    Returns one ScheduleResult per show, in order. Shows are checked against
+    existing shows and against the ones accepted before them in ``shows``.
+    The caller commits.
+    """
+    duration = timedelta(minutes=current_app.config["SHOW_DURATION_MINUTES"])
+    venues = _lock_existing(Venue, {venue_id for venue_id, _, _ in shows})
+    artists = _lock_existing(Artist, {artist_id for _, artist_id, _ in shows})
+
+    valid = [show for show in shows if show[0] in venues and show[1] in artists]
+    bookings = {
+        "venue": _bookings("venue_id", [(v, start) for v, _, start in valid], duration),
+        "artist": _bookings(
+            "artist_id", [(a, start) for _, a, start in valid], duration
+        ),
+    }
+
+    results, accepted = [], []
+    for venue_id, artist_id, start_time in shows:
+        result = ScheduleResult(venue_id, artist_id, start_time)
+        results.append(result)
+        if venue_id not in venues:
+            result.error = f"unknown venue {venue_id}"
+            continue
+        if artist_id not in artists:
+            result.error = f"unknown artist {artist_id}"
+            continue
+
+        for kind, id in (("venue", venue_id), ("artist", artist_id)):
+            clash = _clash(bookings[kind].get(id, []), start_time, duration)
+            if clash is not None:
+                result.error = f"{kind} {id} is already booked at {clash.isoformat()}"
+                break
+        else:
+            insort(bookings["venue"].setdefault(venue_id, []), start_time)
+            insort(bookings["artist"].setdefault(artist_id, []), start_time)
+            accepted.append((venue_id, artist_id, start_time))
+
+    if accepted:
+        db.session.execute(
+            Show.__table__.insert(),
+            [
+                {"venue_id": venue_id, "artist_id": artist_id, "start_time": start_time}
+                for venue_id, artist_id, start_time in accepted
+            ],
+        )
+        show_counters.record_shows(accepted, now)
+
+    return results
+
+
+def _lock_existing(model, ids):
+    # Row locks serialize concurrent batches booking the same venue or
+    # artist until this transaction ends; SQLite ignores FOR UPDATE.
+    if not ids:
+        return set()
+    return set(
+        db.session.execute(
+            db.select(model.id).where(model.id.in_(ids)).with_for_update()
+        )
+        .scalars()
+        .all()
+    )
+
+
+def _bookings(column, shows, duration):
+    """Return ``{id: sorted start times}`` of existing shows near ``shows``.
+
+    ``shows`` holds ``(id, start_time)`` pairs. Each pair needs the shows
+    starting within ``duration`` of it; overlapping windows of one id are
+    merged, and every window is an indexed range lookup on Show and on
+    ShowArchive, so a batch spread over months reads only what it can clash
+    with, archived shows included.
+    """
+    windows = []
+    for id, start_time in sorted(set(shows)):
+        low, high = start_time - duration, start_time + duration
+        if windows and windows[-1][0] == id and low <= windows[-1][2]:
+            windows[-1][2] = max(windows[-1][2], high)
+        else:
+            windows.append([id, low, high])
+    if not windows:
+        return {}
+
+    selects = []
+    for source in (Show, ShowArchive):
+        source_column = getattr(source, column)
+        selects.append(
+            db.select(source_column.label("id"), source.start_time).where(
+                or_(
+                    *(
+                        and_(
+                            source_column == id,
+                            source.start_time > low,
+                            source.start_time < high,
+                        )
+                        for id, low, high in windows
+                    )
+                )
+            )
+        )
+
+    bookings = {}
+    for id, start_time in db.session.execute(db.union_all(*selects)):
+        bookings.setdefault(id, []).append(start_time)
+    for starts in bookings.values():
+        starts.sort()
+    return bookings
+
+
+def _clash(starts, start_time, duration):
+    """Return a start time in sorted ``starts`` within ``duration`` of ``start_time``."""
+    position = bisect_left(starts, start_time)
+    for neighbour in starts[max(position - 1, 0) : position + 1]:
+        if abs(neighbour - start_time) < duration:
+            return neighbour
+    return None
@@ -0,0 +1,358 @@
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+
+from flask import current_app
+from sqlalchemy import event, func, literal, literal_column, or_
+
+from app import db
+from models import Artist, Genre, Venue, genre_artist_table, genre_venue_table
+from queries import Summary
+import conditional
+
+# Ranked, typo-tolerant search over venue and artist names, cities, states
+# and genres. Both models keep a lowercase ``search_text`` document. On
+# Postgres it is matched with a prefix tsquery (GIN index over its tsvector)
+# or, for misspellings, pg_trgm word similarity (GIN trigram index). Other
+# databases use MemoryIndex, an in-process inverted index with the same
+# prefix and trigram matching, kept current by changes.py. Other processes'
+# writes only reach it through the VERSION_KEYS page versions they bump:
+# a search that finds them moved rebuilds the model's index first.
+
+TOKEN = re.compile(r"\w+")
+REGCONFIG = literal_column("'simple'::regconfig")
+
+GENRE_TABLES = {
+    Venue: (genre_venue_table, "venue"),
+    Artist: (genre_artist_table, "artist"),
+}
+
+# Page version keys bumped (see changes.py) when a model's search
+# documents change.
+VERSION_KEYS = {Venue: "search:venue", Artist: "search:artist"}
+
+# Scores of a query token against an indexed token.
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+FUZZY_SCORE = 0.6
+
+
+def document(name, city, state, genres):
+    return " ".join(part for part in (name, city, state, *genres) if part).lower()
+
+
+@event.listens_for(Venue, "before_insert")
+@event.listens_for(Venue, "before_update")
+@event.listens_for(Artist, "before_insert")
+@event.listens_for(Artist, "before_update")
+def _update_document(mapper, connection, target):
+    target.search_text = document(
+        target.name,
+        target.city,
+        target.state,
+        [genre.name for genre in target.genres],
+    )
+
+
+def refresh(model, ids=None):
+    """Recompute ``search_text`` in SQL, for rows written without the ORM."""
+    table, column = GENRE_TABLES[model]
+    if db.engine.dialect.name == "postgresql":
+        aggregate = func.string_agg(Genre.name, " ")
+    else:
+        aggregate = func.group_concat(Genre.name, " ")
+    genres = (
+        db.select(aggregate)
+        .select_from(table)
+        .join(Genre, Genre.id == table.c.genre)
+        .where(table.c[column] == model.id)
+        .scalar_subquery()
+    )
+    parts = [model.name, model.city, model.state, genres]
+    text = func.coalesce(parts[0], "")
+    for part in parts[1:]:
+        text = text + " " + func.coalesce(part, "")
+
+    statement = db.update(model).values(search_text=func.lower(text))
+    if ids is not None:
+        statement = statement.where(model.id.in_(list(ids)))
+    db.session.execute(statement.execution_options(synchronize_session=False))
+
+
+def search(model, term, limit, offset=0):
+    """Return ``{"count", "data"}`` for one page of ranked results."""
+    tokens = TOKEN.findall(term.lower())
+    if not tokens:
+        return _all(model, limit, offset)
+    if db.engine.dialect.name == "postgresql":
+        return _postgres_search(model, tokens, limit, offset)
+    return index.search(
+        model, tokens, limit, offset, current_app.config["SEARCH_SIMILARITY"]
+    )
+
+
+def _postgres_search(model, tokens, limit, offset):
+    vector = func.to_tsvector(REGCONFIG, model.search_text)
+    query = func.to_tsquery(REGCONFIG, " & ".join(f"{token}:*" for token in tokens))
+    phrase = " ".join(tokens)
+    rank = func.ts_rank(vector, query) + func.word_similarity(phrase, model.search_text)
+
+    rows = db.session.execute(
+        db.select(
+            model.id,
+            model.name,
+            model.upcoming_shows_count,
+            func.count().over().label("total"),
+        )
+        .where(or_(vector.op("@@")(query), literal(phrase).op("<%")(model.search_text)))
+        .order_by(rank.desc(), model.name, model.id)
+        .limit(limit)
+        .offset(offset)
+    ).all()
+
+    if rows:
+        count = rows[0].total
+    elif offset:
+        count = db.session.execute(
+            db.select(func.count()).where(
+                or_(
+                    vector.op("@@")(query),
+                    literal(phrase).op("<%")(model.search_text),
+                )
+            )
+        ).scalar()
+    else:
+        count = 0
+
+    return _results(count, rows)
+
+
+def _all(model, limit, offset):
+    rows = db.session.execute(
+        db.select(model.id, model.name, model.upcoming_shows_count)
+        .order_by(model.name, model.id)
+        .limit(limit)
+        .offset(offset)
+    ).all()
+    count = db.session.execute(db.select(func.count(model.id))).scalar()
+    return _results(count, rows)
+
+
+def _results(count, rows):
+    return {
+        "count": count,
+        "data": [Summary(row[0], row[1], row[2]) for row in rows],
+    }
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+class MemoryIndex:
+    """Inverted index of ``search_text`` tokens, one per model.
+
+    Built from the database on the first search and then updated per row by
+    ``update``/``remove``, and rebuilt when a search finds the model's
+    version (see VERSION_KEYS) has moved since the build, which includes
+    this process's own writes. Tokens are kept sorted for prefix lookups
+    and indexed by trigram for misspelled query tokens.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def search(self, model, tokens, limit, offset, similarity):
+        # Read before a rebuild, so writes made during it trigger another.
+        version = conditional.versions(VERSION_KEYS[model])
+        with self._lock:
+            state = self._state(model, version)
+            tiers = [state.match(token, similarity) for token in set(tokens)]
+            if not all(tiers):
+                return _results(0, [])
+
+            # Intersect the matching id sets first, then score the survivors
+            # against each token's best matching tier.
+            matching = []
+            for token_tiers in tiers:
+                sets = [ids for _, ids in token_tiers]
+                matching.append(sets[0] if len(sets) == 1 else set().union(*sets))
+            matching.sort(key=len)
+            candidates = matching[0].intersection(*matching[1:])
+
+            def score(id):
+                return sum(
+                    next(score for score, ids in token_tiers if id in ids)
+                    for token_tiers in tiers
+                )
+
+            names = state.names
+            ranked = heapq.nsmallest(
+                offset + limit, candidates, key=lambda id: (-score(id), names[id], id)
+            )
+
+        page = ranked[offset:]
+        rows = {
+            row.id: row
+            for row in db.session.execute(
+                db.select(model.id, model.name, model.upcoming_shows_count).where(
+                    model.id.in_(page)
+                )
+            )
+        }
+        return _results(len(candidates), [rows[id] for id in page if id in rows])
+
+    def update(self, model, ids):
+        with self._lock:
+            state = self._models.get(model)
+            if state is None:
+                return
+            rows = db.session.execute(
+                db.select(model.id, model.name, model.search_text).where(
+                    model.id.in_(list(ids))
+                )
+            )
+            for id, name, text in rows:
+                state.remove(id)
+                state.add(id, name, text)
+
+    def remove(self, model, id):
+        with self._lock:
+            state = self._models.get(model)
+            if state is not None:
+                state.remove(id)
+
+    def reset(self):
+        with self._lock:
+            self._models.clear()
+
+    def _state(self, model, version):
+        state = self._models.get(model)
+        if state is None or state.version != version:
+            state = self._models[model] = _ModelIndex(version)
+            state.build(
+                db.session.execute(db.select(model.id, model.name, model.search_text))
+            )
+        return state
+
+
+class _ModelIndex:
+    def __init__(self, version=None):
+        self.version = version
+        self.names = {}
+        self.documents = {}
+        self.postings = {}
+        self.sorted_tokens = []
+        self.trigram_tokens = {}
+
+    def build(self, rows):
+        for id, name, text in rows:
+            self._add(id, name, text)
+        self.sorted_tokens = sorted(self.postings)
+        for token in self.sorted_tokens:
+            for trigram in trigrams(token):
+                self.trigram_tokens.setdefault(trigram, set()).add(token)
+
+    def add(self, id, name, text):
+        for token in self._add(id, name, text):
+            insort(self.sorted_tokens, token)
+            for trigram in trigrams(token):
+                self.trigram_tokens.setdefault(trigram, set()).add(token)
+
+    def _add(self, id, name, text):
+        """Index ``id`` and return the tokens that are new to the index."""
+        new = []
+        tokens = set(TOKEN.findall(text or ""))
+        self.names[id] = (name or "").lower()
+        self.documents[id] = tokens
+        for token in tokens:
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = set()
+                new.append(token)
+            posting.add(id)
+        return new
+
+    def remove(self, id):
+        self.names.pop(id, None)
+        for token in self.documents.pop(id, ()):
+            posting = self.postings[token]
+            posting.discard(id)
+            if posting:
+                continue
+            del self.postings[token]
+            del self.sorted_tokens[bisect_left(self.sorted_tokens, token)]
+            for trigram in trigrams(token):
+                self.trigram_tokens[trigram].discard(token)
+
+    def match(self, token, threshold):
+        """Return ``[(score, ids)]`` tiers for one query token, best first.
+
+        Indexed tokens match when ``token`` is a prefix of them, when their
+        trigram similarity reaches ``threshold`` or, for tokens of four or
+        more characters, when they are one edit (two from eight characters)
+        away.
+        """
+        tiers = []
+
+        def credit(indexed, score):
+            tiers.append((score, self.postings[indexed]))
+
+        position = bisect_left(self.sorted_tokens, token)
+        while position < len(self.sorted_tokens):
+            indexed = self.sorted_tokens[position]
+            if not indexed.startswith(token):
+                break
+            credit(indexed, EXACT_SCORE if indexed == token else PREFIX_SCORE)
+            position += 1
+
+        # Only words missing from the index are treated as misspellings.
+        if len(token) < 3 or token in self.postings or token.isdigit():
+            return sorted(tiers, key=lambda tier: -tier[0])
+
+        edits = 0 if len(token) < 4 else 1 if len(token) < 8 else 2
+        wanted = trigrams(token)
+        shared = {}
+        for trigram in wanted:
+            for indexed in self.trigram_tokens.get(trigram, ()):
+                shared[indexed] = shared.get(indexed, 0) + 1
+        # Each edit (a transposition included) changes at most four trigrams.
+        required = max(
+            1, min(len(wanted) - 4 * edits, math.ceil(threshold * len(wanted)))
+        )
+        for indexed, common in shared.items():
+            if common < required:
+                continue
+            similarity = common / (len(wanted) + len(trigrams(indexed)) - common)
+            if similarity >= threshold or (
+                edits and edit_distance(token, indexed, edits) <= edits
+            ):
+                credit(indexed, FUZZY_SCORE * max(similarity, 0.5))
+
+        return sorted(tiers, key=lambda tier: -tier[0])
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or ``limit + 1`` once it exceeds it."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+index = MemoryIndex()
@@ -0,0 +1,152 @@
+from datetime import MAXYEAR, MINYEAR, date, datetime, time, timedelta
+
+from app import db
+from models import Artist, Show, ShowArchive, ShowDailyCount, Venue
+import queries
+
+# Month and week calendars for venues and artists. The shows in a window come
+# from range scans of the (venue_id, start_time) or (artist_id, start_time)
+# indexes of Show and ShowArchive, and the per-day and per-week counts from
+# the ShowDailyCount rollup, so the work done depends on the window's length,
+# not on how much history a venue or artist has.
+
+KINDS = {Venue: "venue", Artist: "artist"}
+
+# Windows keep a year of margin from date's limits, so stepping to the
+# neighbouring month or week (or a heatmap's week start) cannot overflow.
+FIRST_YEAR = MINYEAR + 1
+LAST_YEAR = MAXYEAR - 1
+
+
+def check_year(day):
+    """Raise ``ValueError`` unless ``day`` is in a supported year."""
+    if not FIRST_YEAR <= day.year <= LAST_YEAR:
+        raise ValueError(f"year must be between {FIRST_YEAR} and {LAST_YEAR}")
+    return day
+
+
+def parse_window(month=None, week=None, today=None):
+    """Return ``(start, end, unit)`` for ``month`` (YYYY-MM) or ``week``.
+
+    ``week`` is any YYYY-MM-DD date in the week, which starts on Monday. The
+    current month is used when neither is given. Raises ``ValueError`` for
+    malformed values and years outside ``FIRST_YEAR``..``LAST_YEAR``.
+    """
+    if week:
+        start = check_year(date.fromisoformat(week))
+        start -= timedelta(days=start.weekday())
+        return start, start + timedelta(days=7), "week"
+
+    if month:
+        start = check_year(datetime.strptime(month, "%Y-%m").date())
+    else:
+        start = (today or date.today()).replace(day=1)
+    return start, _next_month(start), "month"
+
+
+def neighbours(start, unit):
+    """Return the query values for the windows before and after ``start``."""
+    if unit == "week":
+        return (
+            {"week": (start - timedelta(days=7)).isoformat()},
+            {"week": (start + timedelta(days=7)).isoformat()},
+        )
+    previous = (start - timedelta(days=1)).replace(day=1)
+    return (
+        {"month": previous.strftime("%Y-%m")},
+        {"month": _next_month(start).strftime("%Y-%m")},
+    )
+
+
+def exists(model, id):
+    return db.session.execute(db.select(model.id).where(model.id == id)).first()
+
+
+def shows(model, id, start, end):
+    """Return the shows of one venue or artist starting in ``[start, end)``.
+
+    Archived shows are included, so old months read the cold partitions.
+    """
+    rows = []
+    for source in (ShowArchive, Show):
+        statement = queries.show_rows(source, model, id).where(
+            source.start_time >= datetime.combine(start, time()),
+            source.start_time < datetime.combine(end, time()),
+        )
+        rows.extend(
+            dict(row._mapping)
+            for row in db.session.execute(
+                statement.order_by(source.start_time, source.id)
+            )
+        )
+    rows.sort(key=lambda row: (row["start_time"], row["id"]))
+    return rows
+
+
+def day_counts(model, id, start, end):
+    """Return ``{day: shows}`` from the rollup, for days in ``[start, end)``."""
+    kind = KINDS[model]
+    table = ShowDailyCount.__table__
+    rows = db.session.execute(
+        db.select(table.c.day, table.c.show_count).where(
+            table.c.kind == kind,
+            table.c.owner_id == id,
+            table.c.day >= start,
+            table.c.day < end,
+        )
+    )
+    return {day: count for day, count in rows if count}
+
+
+def buckets(counts, start, end, by):
+    """Return a dense ``[(bucket start, shows)]`` list over ``[start, end)``.
+
+    ``by`` is ``"day"`` or ``"week"``; weeks start on Monday, so the first
+    bucket may begin before ``start``.
+    """
+    step = timedelta(days=7 if by == "week" else 1)
+    if by == "week":
+        start -= timedelta(days=start.weekday())
+    totals = {}
+    for day, count in counts.items():
+        bucket = day - timedelta(days=day.weekday()) if by == "week" else day
+        totals[bucket] = totals.get(bucket, 0) + count
+
+    result = []
+    while start < end:
+        result.append((start, totals.get(start, 0)))
+        start += step
+    return result
+
+
+def bucket_count(start, end, by):
+    days = (end - start).days
+    return -(-days // 7) + 1 if by == "week" else days
+
+
+def grid(start, end, counts, shows):
+    """Lay ``[start, end)`` out as Monday-first weeks of day cells."""
+    by_day = {}
+    for show in shows:
+        by_day.setdefault(show["start_time"].date(), []).append(show)
+
+    day = start - timedelta(days=start.weekday())
+    weeks = []
+    while day < end:
+        week = []
+        for _ in range(7):
+            week.append(
+                {
+                    "date": day,
+                    "in_window": start <= day < end,
+                    "count": counts.get(day, 0),
+                    "shows": by_day.get(day, []),
+                }
+            )
+            day += timedelta(days=1)
+        weeks.append(week)
+    return weeks
+
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
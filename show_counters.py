@@ -0,0 +1,212 @@
+from collections import Counter, defaultdict
+
+from sqlalchemy import bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import Artist, Show, ShowArchive, ShowDailyCount, Venue
+
+# Venue and Artist carry denormalized upcoming_shows_count, past_shows_count
+# and next_show_time columns so listings never count shows per row. Inserts
+# are applied incrementally; anything that removes shows recounts the
+# affected rows, and roll_forward() moves shows from upcoming to past once
+# their start_time has gone by.
+#
+# ShowDailyCount rolls shows up per venue or artist and day for the calendar
+# heatmaps. It follows the same rules: record_shows() increments it and
+# recount_days() rebuilds it for rows that lost shows.
+#
+# Archived shows (ShowArchive) still count as past shows and still appear in
+# the rollup.
+
+KINDS = {Venue: ("venue", "venue_id"), Artist: ("artist", "artist_id")}
+
+
+def record_shows(shows, now):
+    """Count newly added ``(venue_id, artist_id, start_time)`` shows.
+
+    Issues one executemany UPDATE per model, whatever the number of shows.
+    """
+    deltas = {
+        Venue: defaultdict(lambda: [0, 0, None]),
+        Artist: defaultdict(lambda: [0, 0, None]),
+    }
+
+    for venue_id, artist_id, start_time in shows:
+        for model, id in ((Venue, venue_id), (Artist, artist_id)):
+            delta = deltas[model][id]
+            if start_time > now:
+                delta[0] += 1
+                if delta[2] is None or start_time < delta[2]:
+                    delta[2] = start_time
+            else:
+                delta[1] += 1
+
+    for model, rows in deltas.items():
+        if rows:
+            db.session.execute(
+                _increment_statement(model),
+                [
+                    {"_id": id, "_upcoming": upcoming, "_past": past, "_next": next}
+                    for id, (upcoming, past, next) in rows.items()
+                ],
+            )
+
+    _record_days(shows)
+
+
+def record_show(venue_id, artist_id, start_time, now):
+    record_shows([(venue_id, artist_id, start_time)], now)
+
+
+def recount(model, now, ids=None):
+    """Recompute the counters of ``model`` rows from the Show table.
+
+    ``ids`` limits the recount to those rows; ``None`` recounts every row.
+    """
+    table = model.__table__
+    column = KINDS[model][1]
+    show_column = getattr(Show, column)
+    shows = db.select(db.func.count(Show.id)).where(show_column == table.c.id)
+    archived = db.select(db.func.count(ShowArchive.id)).where(
+        getattr(ShowArchive, column) == table.c.id
+    )
+    next_show = db.select(db.func.min(Show.start_time)).where(
+        show_column == table.c.id, Show.start_time > now
+    )
+
+    statement = table.update().values(
+        upcoming_shows_count=shows.where(Show.start_time > now).scalar_subquery(),
+        past_shows_count=shows.where(Show.start_time <= now).scalar_subquery()
+        + archived.scalar_subquery(),
+        next_show_time=next_show.scalar_subquery(),
+    )
+    if ids is not None:
+        statement = statement.where(table.c.id.in_(list(ids)))
+
+    return db.session.execute(statement).rowcount
+
+
+def recount_days(model, ids=None):
+    """Rebuild the daily rollup of ``model`` rows from Show and ShowArchive."""
+    kind, column = KINDS[model]
+    table = ShowDailyCount.__table__
+
+    selects = []
+    for source in (Show, ShowArchive):
+        select = db.select(getattr(source, column).label("owner_id"), source.start_time)
+        if ids is not None:
+            select = select.where(getattr(source, column).in_(list(ids)))
+        selects.append(select)
+    shows = db.union_all(*selects).subquery()
+    day = db.func.date(shows.c.start_time)
+
+    delete = table.delete().where(table.c.kind == kind)
+    if ids is not None:
+        delete = delete.where(table.c.owner_id.in_(list(ids)))
+    counts = db.select(
+        db.literal(kind), shows.c.owner_id, day, db.func.count()
+    ).group_by(shows.c.owner_id, day)
+
+    db.session.execute(delete)
+    db.session.execute(
+        table.insert().from_select(["kind", "owner_id", "day", "show_count"], counts)
+    )
+
+
+def roll_forward(now):
+    """Recount every venue and artist whose next show has started.
+
+    Returns the number of rows updated.
+    """
+    updated = 0
+
+    for model in (Venue, Artist):
+        ids = (
+            db.session.execute(db.select(model.id).where(model.next_show_time <= now))
+            .scalars()
+            .all()
+        )
+        if ids:
+            updated += recount(model, now, ids)
+
+    return updated
+
+
+def _increment_statement(model):
+    table = model.__table__
+    next = bindparam("_next", type_=db.DateTime)
+
+    return (
+        table.update()
+        .where(table.c.id == bindparam("_id"))
+        .values(
+            upcoming_shows_count=table.c.upcoming_shows_count + bindparam("_upcoming"),
+            past_shows_count=table.c.past_shows_count + bindparam("_past"),
+            next_show_time=db.case(
+                (next.is_(None), table.c.next_show_time),
+                (table.c.next_show_time.is_(None), next),
+                (next < table.c.next_show_time, next),
+                else_=table.c.next_show_time,
+            ),
+        )
+    )
+
+
+def _record_days(shows):
+    days = Counter()
+    for venue_id, artist_id, start_time in shows:
+        days["venue", venue_id, start_time.date()] += 1
+        days["artist", artist_id, start_time.date()] += 1
+    if not days:
+        return
+
+    table = ShowDailyCount.__table__
+    rows = [
+        {"kind": kind, "owner_id": id, "day": day, "show_count": count}
+        for (kind, id, day), count in days.items()
+    ]
+    dialect = db.engine.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        db.session.execute(
+            insert.on_conflict_do_update(
+                index_elements=["kind", "owner_id", "day"],
+                set_={"show_count": table.c.show_count + insert.excluded.show_count},
+            ),
+            rows,
+        )
+        return
+
+    key = db.tuple_(table.c.kind, table.c.owner_id, table.c.day)
+    existing = {
+        tuple(row)
+        for row in db.session.execute(
+            db.select(table.c.kind, table.c.owner_id, table.c.day).where(
+                key.in_(list(days))
+            )
+        )
+    }
+    increments = [
+        {"_kind": kind, "_id": id, "_day": day, "_count": count}
+        for (kind, id, day), count in days.items()
+        if (kind, id, day) in existing
+    ]
+    if increments:
+        db.session.execute(
+            table.update()
+            .where(
+                table.c.kind == bindparam("_kind"),
+                table.c.owner_id == bindparam("_id"),
+                table.c.day == bindparam("_day"),
+            )
+            .values(show_count=table.c.show_count + bindparam("_count")),
+            increments,
+        )
+    new_rows = [
+        row
+        for row in rows
+        if (row["kind"], row["owner_id"], row["day"]) not in existing
+    ]
+    if new_rows:
+        db.session.execute(table.insert(), new_rows)
@@ -22,3 +22,93 @@ window.handleDeleteVenue = function handleDeleteVenue(venueId) {
 			console.log(error);
 		});
 };
+
+// Navbar autocomplete: inputs with data-suggest="venue|artist" show name
+// suggestions from /api/suggest as the user types. Enter on a highlighted
+// suggestion opens it; otherwise the form submits a full search.
+document.querySelectorAll("input[data-suggest]").forEach(function (input) {
+	var form = input.form;
+	var list = document.createElement("ul");
+	var items = [];
+	var active = -1;
+	var timer = null;
+	var sequence = 0;
+
+	list.className = "dropdown-menu suggestions";
+	form.style.position = "relative";
+	form.appendChild(list);
+
+	function hide() {
+		list.style.display = "none";
+		items = [];
+		active = -1;
+	}
+
+	function highlight(index) {
+		items.forEach(function (item, i) {
+			item.classList.toggle("active", i === index);
+		});
+		active = index;
+	}
+
+	function render(suggestions) {
+		list.innerHTML = "";
+		items = suggestions.map(function (suggestion) {
+			var item = document.createElement("li");
+			var link = document.createElement("a");
+			link.href = suggestion.url;
+			link.textContent = suggestion.name;
+			item.appendChild(link);
+			list.appendChild(item);
+			return item;
+		});
+		active = -1;
+		list.style.display = items.length ? "block" : "none";
+	}
+
+	input.addEventListener("input", function () {
+		clearTimeout(timer);
+		var query = input.value.trim();
+		if (!query) {
+			hide();
+			return;
+		}
+		timer = setTimeout(function () {
+			var current = ++sequence;
+			var params = new URLSearchParams({ type: input.dataset.suggest, q: query });
+			fetch(`/api/suggest?${params}`)
+				.then(response => response.json())
+				.then(suggestions => {
+					if (current === sequence) {
+						render(suggestions);
+					}
+				})
+				.catch(error => {
+					console.log(error);
+				});
+		}, 80);
+	});
+
+	input.addEventListener("keydown", function (event) {
+		if (!items.length) {
+			return;
+		}
+		if (event.key === "ArrowDown") {
+			event.preventDefault();
+			highlight((active + 1) % items.length);
+		} else if (event.key === "ArrowUp") {
+			event.preventDefault();
+			highlight((active - 1 + items.length) % items.length);
+		} else if (event.key === "Enter" && active >= 0) {
+			event.preventDefault();
+			window.location.href = items[active].firstChild.href;
+		} else if (event.key === "Escape") {
+			hide();
+		}
+	});
+
+	input.addEventListener("blur", function () {
+		// Leave time for a click on a suggestion to register.
+		setTimeout(hide, 150);
+	});
+});
@@ -0,0 +1,121 @@
+import re
+import threading
+from bisect import bisect_left, insort
+
+from app import db
+from models import Artist, Venue
+
+# Keystroke-level name suggestions for the navbar search boxes. Each model
+# has a sorted array of normalized keys, one per word start of every name
+# ("the blue room", "blue room", "room"), so a prefix lookup is one bisect
+# plus a short forward scan and never touches the database. The arrays are
+# built on the first lookup and kept current by changes.py.
+
+MODELS = {"venue": Venue, "artist": Artist}
+NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    return NON_WORD.sub(" ", (text or "").lower()).strip()
+
+
+def keys(name):
+    words = normalize(name).split()
+    return [" ".join(words[index:]) for index in range(len(words))]
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.entries = []
+        self.names = {}
+
+    def build(self, rows):
+        self.names = {id: name for id, name in rows}
+        self.entries = sorted(
+            (key, id) for id, name in self.names.items() for key in keys(name)
+        )
+
+    def add(self, id, name):
+        self.remove(id)
+        self.names[id] = name
+        for key in keys(name):
+            insort(self.entries, (key, id))
+
+    def remove(self, id):
+        name = self.names.pop(id, None)
+        if name is None:
+            return
+        for key in keys(name):
+            position = bisect_left(self.entries, (key, id))
+            if position < len(self.entries) and self.entries[position] == (key, id):
+                del self.entries[position]
+
+    def lookup(self, prefix, limit):
+        """Return up to ``limit`` ``(id, name)`` pairs for ``prefix``.
+
+        Takes the first ``limit`` distinct names in key order, listing the
+        names that start with the prefix before those where a later word
+        does.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        leading, inner, seen = [], [], set()
+        position = bisect_left(self.entries, (prefix,))
+        while position < len(self.entries) and len(seen) < limit:
+            key, id = self.entries[position]
+            if not key.startswith(prefix):
+                break
+            position += 1
+            if id in seen:
+                continue
+            seen.add(id)
+            name = self.names[id]
+            if len(key) == len(normalize(name)):
+                leading.append((id, name))
+            else:
+                inner.append((id, name))
+        return leading + inner
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, model, prefix, limit):
+        index = self._indexes.get(model)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(model)
+                if index is None:
+                    index = PrefixIndex()
+                    index.build(db.session.execute(db.select(model.id, model.name)))
+                    self._indexes[model] = index
+        with self._lock:
+            return index.lookup(prefix, limit)
+
+    def update(self, model, ids):
+        with self._lock:
+            index = self._indexes.get(model)
+            if index is None:
+                return
+            rows = db.session.execute(
+                db.select(model.id, model.name).where(model.id.in_(list(ids)))
+            )
+            for id, name in rows:
+                index.add(id, name)
+
+    def remove(self, model, id):
+        with self._lock:
+            index = self._indexes.get(model)
+            if index is not None:
+                index.remove(id)
+
+    def reset(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+index = SuggestIndex()
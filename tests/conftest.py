@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# config.py reads the environment when app.py is first imported, which the
+# test modules do at collection time.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+    tempfile.mkdtemp(prefix="fyyur-tests-"), "fyyur.db"
+)
+os.environ["CACHE_BACKEND"] = "none"
+for name in ("DATABASE_REPLICA_URL", "PROFILE_SAMPLE_RATE", "PROFILE_SECRET"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """An empty database, inside an application context."""
+    from app import db
+    import genre_registry
+
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+        genre_registry.registry.invalidate()
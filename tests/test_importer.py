@@ -0,0 +1,103 @@
+import io
+import json
+from datetime import datetime, timedelta
+
+import importer
+from models import Artist, Genre, Show, Venue
+
+
+def ndjson(*rows):
+    return importer.read_rows(
+        io.StringIO("".join(json.dumps(row) + "\n" for row in rows)), "ndjson"
+    )
+
+
+def venue(name, **fields):
+    return {"name": name, "city": "Austin", "state": "TX", **fields}
+
+
+def test_mixed_explicit_and_generated_ids(db):
+    report = importer.ImportReport()
+    importer.import_entities(
+        Venue,
+        ndjson(
+            venue("Generated A"),
+            venue("Explicit 10", id=10),
+            venue("Generated B", genres="Jazz;Blues"),
+            venue("Explicit 11", id="11"),
+        ),
+        chunk_size=10,
+        report=report,
+    )
+
+    assert (report.imported, report.rejected) == (4, 0)
+    ids = {venue.name: venue.id for venue in Venue.query}
+    assert ids["Explicit 10"] == 10 and ids["Explicit 11"] == 11
+    assert len(set(ids.values())) == 4
+
+    # Later generated ids do not collide with the explicit ones.
+    importer.import_entities(
+        Venue, ndjson(venue("Generated C")), chunk_size=10, report=report
+    )
+    assert report.imported == 5
+    assert Venue.query.filter_by(name="Generated C").one().id not in ids.values()
+
+    genres = Venue.query.filter_by(name="Generated B").one().genres
+    assert sorted(genre.name for genre in genres) == ["Blues", "Jazz"]
+
+
+def test_duplicate_explicit_ids_are_rejected_by_line(db):
+    errors = io.StringIO()
+    report = importer.ImportReport(errors)
+    importer.import_entities(
+        Venue,
+        ndjson(venue("First", id=5), venue("Again", id=5), venue("")),
+        chunk_size=2,
+        report=report,
+    )
+    importer.import_entities(
+        Venue, ndjson(venue("Taken", id=5)), chunk_size=2, report=report
+    )
+
+    assert (report.imported, report.rejected) == (1, 3)
+    assert errors.getvalue().splitlines() == [
+        "line 2: duplicate id 5",
+        "line 3: missing name",
+        "line 1: duplicate id 5",
+    ]
+    assert Venue.query.get(5).name == "First"
+
+
+def test_show_import_rejects_double_bookings(db):
+    db.session.add_all(
+        [
+            Venue(id=1, name="Hall", city="Austin", state="TX"),
+            Artist(id=1, name="Ada", city="Austin", state="TX"),
+            Artist(id=2, name="Kim", city="Austin", state="TX"),
+        ]
+    )
+    db.session.commit()
+    start = datetime.now() + timedelta(days=30)
+
+    errors = io.StringIO()
+    report = importer.ImportReport(errors)
+    importer.import_shows(
+        ndjson(
+            {"venue_id": 1, "artist_id": 1, "start_time": start.isoformat()},
+            {
+                "venue_id": 1,
+                "artist_id": 2,
+                "start_time": (start + timedelta(hours=1)).isoformat(),
+            },
+            {"venue_id": 9, "artist_id": 1, "start_time": start.isoformat()},
+        ),
+        chunk_size=10,
+        report=report,
+    )
+
+    assert (report.imported, report.rejected) == (1, 2)
+    assert "venue 1 is already booked" in errors.getvalue()
+    assert "unknown venue 9" in errors.getvalue()
+    assert Show.query.count() == 1
+    assert Venue.query.get(1).upcoming_shows_count == 1
+    assert Genre.query.count() == 0
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import queries
+from models import Artist, Show, ShowArchive, Venue
+
+NOW = datetime(2030, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def shows(db):
+    """Seven shows of venue 1, three sharing one start time, and two archived."""
+    db.session.add(Venue(id=1, name="Hall", city="Austin", state="TX"))
+    db.session.add(Artist(id=1, name="Ada", city="Austin", state="TX"))
+    tie = NOW - timedelta(days=2)
+    starts = [NOW - timedelta(days=3), tie, tie, tie, NOW - timedelta(days=1)]
+    starts += [NOW + timedelta(days=1), NOW + timedelta(days=2)]
+    for id, start in enumerate(starts, start=1):
+        db.session.add(Show(id=id, venue_id=1, artist_id=1, start_time=start))
+    for id in (100, 101):
+        db.session.add(
+            ShowArchive(
+                id=id,
+                venue_id=1,
+                artist_id=1,
+                start_time=NOW - timedelta(days=400 + id),
+            )
+        )
+    db.session.commit()
+    return db
+
+
+def walk(per_page, **filters):
+    pages, after = [], None
+    while True:
+        rows, cursor = queries.show_page(NOW, after=after, per_page=per_page, **filters)
+        pages.append([row["id"] for row in rows])
+        if cursor is None:
+            return pages
+        after = queries.parse_cursor(cursor)
+
+
+def test_show_pages_split_ties_without_gaps(shows):
+    pages = walk(2)
+
+    assert pages == [[101, 100], [1, 2], [3, 4], [5, 6], [7]]
+
+
+def test_show_pages_end_exactly_on_a_full_page(shows):
+    assert walk(2, when="upcoming") == [[6, 7]]
+    assert walk(5, when="past") == [[101, 100, 1, 2, 3], [4, 5]]
+
+
+def test_show_page_after_the_last_row_is_empty(shows):
+    rows, cursor = queries.show_page(
+        NOW, after=(NOW + timedelta(days=2), 7), per_page=2
+    )
+
+    assert (rows, cursor) == ([], None)
+
+
+def test_past_shows_pages_continue_into_the_archive(shows):
+    ids, before = [], None
+    for archive in (False, False, True):
+        rows, more = queries.past_shows(
+            Venue, 1, NOW, before=before, archive=archive, per_page=2
+        )
+        ids.append([row["id"] for row in rows])
+        before = (rows[-1]["start_time"], rows[-1]["id"])
+
+    assert ids == [[5, 4], [3, 2], [1, 100]]
+    assert more
+    assert queries.has_archived_shows(Venue, 1)
+
+
+def test_cursor_round_trip():
+    start = datetime(2030, 1, 1, 12, 0, 30, 250)
+
+    assert queries.parse_cursor(queries.format_cursor(start, 42)) == (start, 42)
+    with pytest.raises(ValueError):
+        queries.parse_cursor("yesterday,1")
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import scheduling
+from models import Artist, Show, ShowArchive, Venue
+
+START = datetime(2031, 6, 1, 20, 0)
+
+
+@pytest.fixture
+def booked(db):
+    """Venues 1-2 and artists 1-2; venue 1 and artist 1 play at START."""
+    for id in (1, 2):
+        db.session.add(Venue(id=id, name=f"Venue {id}", city="Austin", state="TX"))
+        db.session.add(Artist(id=id, name=f"Artist {id}", city="Austin", state="TX"))
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=START))
+    db.session.commit()
+    return db
+
+
+def schedule(*shows):
+    return [result.error for result in scheduling.schedule(shows, datetime.now())]
+
+
+def test_conflicts_with_existing_shows(booked, app):
+    duration = timedelta(minutes=app.config["SHOW_DURATION_MINUTES"])
+
+    assert schedule(
+        (1, 2, START + duration - timedelta(minutes=1)),
+        (2, 1, START - duration + timedelta(minutes=1)),
+        (2, 2, START),
+    ) == [
+        f"venue 1 is already booked at {START.isoformat()}",
+        f"artist 1 is already booked at {START.isoformat()}",
+        None,
+    ]
+
+
+def test_back_to_back_shows_do_not_conflict(booked, app):
+    duration = timedelta(minutes=app.config["SHOW_DURATION_MINUTES"])
+
+    assert schedule((1, 2, START + duration), (2, 1, START - duration)) == [None, None]
+    assert Show.query.count() == 3
+
+
+def test_conflicts_within_a_batch(booked):
+    later = START + timedelta(days=1)
+
+    errors = schedule((2, 2, later), (2, 1, later + timedelta(minutes=30)))
+
+    assert errors == [None, f"venue 2 is already booked at {later.isoformat()}"]
+
+
+def test_batches_spread_over_months(booked):
+    # Far apart start times for one venue each get their own window.
+    errors = schedule(
+        (1, 2, START - timedelta(days=90)),
+        (1, 2, START + timedelta(minutes=10)),
+        (1, 2, START + timedelta(days=90)),
+    )
+
+    assert errors == [None, f"venue 1 is already booked at {START.isoformat()}", None]
+
+
+def test_conflicts_with_archived_shows(booked):
+    past = datetime(2020, 1, 1, 20, 0)
+    booked.session.add(ShowArchive(id=100, venue_id=2, artist_id=2, start_time=past))
+    booked.session.commit()
+
+    assert schedule((2, 1, past + timedelta(hours=1))) == [
+        f"venue 2 is already booked at {past.isoformat()}"
+    ]
+
+
+def test_unknown_venue_and_artist(booked):
+    assert schedule((9, 1, START), (1, 9, START)) == [
+        "unknown venue 9",
+        "unknown artist 9",
+    ]
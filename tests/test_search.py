@@ -0,0 +1,32 @@
+import conditional
+import search
+from models import Venue
+
+
+def add_venue(db, id, name):
+    # Written the way another worker would: no changes.py hooks run here.
+    db.session.add(Venue(id=id, name=name, city="Austin", state="TX"))
+    db.session.commit()
+
+
+def test_memory_index_sees_other_processes_writes(db):
+    search.index.reset()
+    add_venue(db, 1, "Blue Owl")
+    assert [row.id for row in search.search(Venue, "owl", 10)["data"]] == [1]
+
+    add_venue(db, 2, "Owl Hall")
+    assert search.search(Venue, "owl", 10)["count"] == 1
+
+    conditional.bump([search.VERSION_KEYS[Venue]])
+    assert [row.id for row in search.search(Venue, "owl", 10)["data"]] == [1, 2]
+
+
+def test_memory_index_rebuilds_after_a_global_bump(db):
+    search.index.reset()
+    add_venue(db, 1, "Blue Owl")
+    search.search(Venue, "owl", 10)
+
+    add_venue(db, 2, "Owl Hall")
+    conditional.bump()
+
+    assert search.search(Venue, "hall", 10)["count"] == 1